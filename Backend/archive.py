@@ -0,0 +1,103 @@
+import argparse
+import logging
+from uuid import UUID
+from sqlalchemy import delete, false, func, insert, not_, select, union
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+from models import Project, Task, TaskArchive, TaskComment, TaskCommentArchive
+
+# Cold storage for archived projects: their tasks and comments leave the hot tables (tasks / task_comments)
+# for tasks_archive / task_comments_archive, so the hot tables and their indexes only hold live work.
+# - archiving a project (PUT /projects/{id}/archive) moves its rows to the archive, unarchiving
+#   (PUT /projects/{id}/unarchive) moves them back, and so does a status change through PUT /projects/{id};
+#   the move runs after the response (routers/projects.py)
+# - a move goes ARCHIVE_BATCH_SIZE tasks at a time, each batch in its own transaction: the tasks are locked,
+#   copied with their comments (INSERT ... SELECT), then deleted from the side they came from. A task and its
+#   comments are always together on one side, and a reader sees every task on exactly one side.
+# - a move stops as soon as the project's status no longer asks for it (unarchived halfway through)
+# - reads cover both sides (crud_tasks), archived tasks are read-only (their writes 404 until unarchived),
+#   the counters don't change (a moved task still counts) and the cached reads hold the same rows
+# - full-text search covers both sides too, each with its own index (fulltext.py): archived work stays findable
+# python -m archive finishes interrupted moves (worker restarted mid-way, tasks added to an archived project):
+#   python -m archive [--project ID]
+
+logger = logging.getLogger(__name__)
+
+TASK_FIELDS = [column.key for column in Task.__table__.columns]
+COMMENT_FIELDS = [column.key for column in TaskComment.__table__.columns]
+
+# direction -> (tasks from, tasks to, comments from, comments to)
+TIERS = {
+    "archive": (Task.__table__, TaskArchive.__table__, TaskComment.__table__, TaskCommentArchive.__table__),
+    "restore": (TaskArchive.__table__, Task.__table__, TaskCommentArchive.__table__, TaskComment.__table__),
+}
+
+
+# archived projects live in the archive tables (unless ARCHIVE_COLD_STORAGE is off: then everything goes back)
+def _archived():
+    return func.coalesce(Project.status, "active") == "archived" if settings.ARCHIVE_COLD_STORAGE else false()
+
+def _wanted(project_status) -> str:
+    return "archive" if project_status == "archived" and settings.ARCHIVE_COLD_STORAGE else "restore"
+
+
+def move_project(db: Session, project_id: UUID, batch_size: int = settings.ARCHIVE_BATCH_SIZE) -> int:
+    moved = 0
+    while True:
+        project = db.execute(select(Project.status).where(Project.id == project_id)).first()
+        if project is None:
+            break
+        tasks_from, tasks_to, comments_from, comments_to = TIERS[_wanted(project.status)]
+        # (rows another batch moved meanwhile are skipped by the lock: deleted once it's granted)
+        ids = db.scalars(select(tasks_from.c.id).where(tasks_from.c.project_id == project_id)
+                         .limit(batch_size).with_for_update()).all()
+        if not ids:
+            break
+        db.execute(insert(tasks_to).from_select(
+            TASK_FIELDS, select(*(tasks_from.c[name] for name in TASK_FIELDS)).where(tasks_from.c.id.in_(ids))))
+        db.execute(insert(comments_to).from_select(
+            COMMENT_FIELDS, select(*(comments_from.c[name] for name in COMMENT_FIELDS)).where(comments_from.c.task_id.in_(ids))))
+        db.execute(delete(comments_from).where(comments_from.c.task_id.in_(ids)))
+        db.execute(delete(tasks_from).where(tasks_from.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+    db.commit()
+    return moved
+
+
+# after the archive / unarchive / status update response, in the threadpool, with a session of its own
+def move_in_background(project_id: UUID):
+    db = SessionLocal()
+    try:
+        moved = move_project(db, project_id)
+        logger.info("project %s: %d tasks moved between the hot and archive tables", project_id, moved)
+    except Exception:
+        logger.exception("moving project %s between the hot and archive tables failed (python -m archive resumes it)", project_id)
+    finally:
+        db.close()
+
+
+# projects with tasks on the wrong side: archived ones with hot tasks, the others with archived tasks
+def pending_projects(db: Session) -> list:
+    return db.scalars(union(
+        select(Task.project_id).join(Project, Project.id == Task.project_id).where(_archived()),
+        select(TaskArchive.project_id).join(Project, Project.id == TaskArchive.project_id).where(not_(_archived())),
+    )).all()
+
+
+def main(args):
+    db = SessionLocal()
+    try:
+        project_ids = [args.project] if args.project else pending_projects(db)
+        for project_id in project_ids:
+            print(f"project {project_id}: {move_project(db, project_id, args.batch_size)} tasks moved")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move archived projects' tasks and comments to the archive tables (and unarchived ones back)")
+    parser.add_argument("--project", type=UUID, help="only this project")
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    main(parser.parse_args())
@@ -0,0 +1,56 @@
+import argparse
+import json
+import sys
+
+# Compare two result files of run.py / micro.py (same endpoint + concurrency level side by side).
+#   python -m benchmarks.compare before.json after.json --threshold 10
+# Exits with 1 when a p95 latency grew, or a throughput dropped, by more than --threshold percent.
+
+METRICS = [("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("throughput_rps", True)]  # (key, higher is better)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        data = json.load(f)
+    return data["meta"], {(r["name"], r["concurrency"]): r for r in data["results"]}
+
+
+def change(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main(args) -> int:
+    old_meta, old = load(args.before)
+    new_meta, new = load(args.after)
+    print(f"before: {old_meta.get('commit')} ({old_meta.get('timestamp')})   after: {new_meta.get('commit')} ({new_meta.get('timestamp')})")
+    if old_meta.get("settings") != new_meta.get("settings") or old_meta.get("seed") != new_meta.get("seed"):
+        print("warning: the runs used different settings or seed sizes")
+
+    regressions = []
+    print(f"{'endpoint':40} {'c':>4}" + "".join(f"  {key:>31}" for key, _ in METRICS))
+    for key in sorted(old.keys() & new.keys()):
+        row = f"{key[0]:40} {key[1]:>4}"
+        for metric, higher_is_better in METRICS:
+            delta = change(old[key][metric], new[key][metric])
+            row += f"  {old[key][metric]:>9.2f} -> {new[key][metric]:>9.2f} {delta:+7.1f}%"
+            worse = -delta if higher_is_better else delta
+            if metric in ("p95_ms", "throughput_rps") and worse > args.threshold:
+                regressions.append(f"{key[0]} c={key[1]} {metric} {delta:+.1f}%")
+        print(row)
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:40} {key[1]:>4} only in {'before' if key in old else 'after'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold}%:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent of p95 / throughput change to fail on")
+    sys.exit(main(parser.parse_args()))
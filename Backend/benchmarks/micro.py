@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import time
+from uuid import UUID
+from auth_utils import create_access_token
+from benchmarks import seed as seeding
+from benchmarks.stats import default_output, metadata, summarize
+from crud import crud_project, crud_search, crud_tasks, crud_users
+from database import SessionLocal
+from dependencies import decode_token
+from schemas import SearchFilter, TaskFilter
+from security import get_password_hash, verify_password
+
+# Micro-benchmarks: the functions behind the hot endpoints, called directly (no HTTP, no event loop),
+# so a regression can be pinned on the auth helpers or on a crud query.
+#   python -m benchmarks.micro --manifest benchmarks/results/seed.json
+# Same result format as run.py (concurrency is always 1), compare with benchmarks.compare.
+
+
+def time_calls(name: str, fn, iterations: int) -> dict:
+    fn()  # warm-up
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, 1, latencies, errors, time.perf_counter() - start)
+
+
+def operations(db, manifest: dict) -> dict:
+    user_id = UUID(manifest["user_ids"][0])
+    project_id = UUID(manifest["project_ids"][0])
+    task_id = UUID(manifest["task_ids"][0])
+    token = create_access_token({"sub": str(user_id), "roles": ["project_manager"], "ver": 0})
+    hashed = get_password_hash(manifest["password"])
+    return {
+        "decode_token": lambda: decode_token(token),
+        "verify_password": lambda: verify_password(manifest["password"], hashed),
+        "crud.get_user": lambda: crud_users.get_user(db, user_id),
+        "crud.get_tasks_by_projetId": lambda: crud_tasks.get_tasks_by_projetId(db, project_id),
+        "crud.get_tasks_by_projetId.filtered": lambda: crud_tasks.get_tasks_by_projetId(db, project_id, TaskFilter(status="todo"), None, 20),
+        "crud.get_task_by_id": lambda: crud_tasks.get_task_by_id(db, task_id),
+        "crud.get_comment_by_taskId": lambda: crud_tasks.get_comment_by_taskId(db, task_id),
+        "crud.get_my_projects": lambda: crud_project.get_my_projects(db, user_id),
+        "crud.get_project_summary": lambda: crud_tasks.get_project_summary(db, project_id),
+        "crud.search": lambda: crud_search.search(db, SearchFilter(q=manifest["words"][0]), user_id),
+    }
+
+
+# bcrypt is deliberately slow, a few calls are enough
+SLOW_OPERATIONS = {"verify_password": 0.02}
+
+
+def main(args):
+    if args.seed:
+        manifest = seeding.seed_from_args(args)
+        seeding.write_manifest(manifest, args.manifest)
+    else:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+
+    db = SessionLocal()
+    results = []
+    try:
+        for name, fn in operations(db, manifest).items():
+            iterations = max(int(args.iterations * SLOW_OPERATIONS.get(name, 1)), 5)
+            result = time_calls(name, fn, iterations)
+            db.rollback()  # don't let the session / identity map grow across operations
+            db.expunge_all()
+            results.append(result)
+            print(f"{name:40} {result['throughput_rps']:>10.1f} ops/s  p50 {result['p50_ms']:>8.3f}ms  "
+                  f"p95 {result['p95_ms']:>8.3f}ms  p99 {result['p99_ms']:>8.3f}ms")
+    finally:
+        db.close()
+
+    output = args.output or default_output("micro")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": metadata(mode="micro", iterations=args.iterations, seed=manifest["sizes"]),
+                   "results": results}, f, indent=2)
+    print(f"results -> {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the auth helpers and crud queries")
+    parser.add_argument("--seed", action="store_true", help="seed fresh data first (see benchmarks/seed.py)")
+    seeding.add_arguments(parser)
+    parser.add_argument("--manifest", default="benchmarks/results/seed.json", help="seed manifest (written with --seed, read otherwise)")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--output", help="result file (default benchmarks/results/micro-<time>-<commit>.json)")
+    main(parser.parse_args())
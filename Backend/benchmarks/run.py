@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import httpx
+
+# One client signs in every seeded user and then drives the whole load: per-IP / per-user rate limits would turn
+# most of it into 429s (RATE_LIMIT_AUTH allows 10 sign-ins a minute), so the limiter is off in-process unless
+# RATE_LIMIT_ENABLED says otherwise. Start a --url server with RATE_LIMIT_ENABLED=false too.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from benchmarks import seed as seeding  # noqa: E402  (reads the settings)
+from benchmarks.stats import default_output, metadata, summarize  # noqa: E402
+
+# HTTP benchmark of the API hot paths: throughput and p50/p95/p99 latency per endpoint and concurrency level.
+#
+#   python -m benchmarks.run --seed                         # seed, then benchmark the app in-process (ASGI)
+#   python -m benchmarks.run --manifest seed.json --url http://127.0.0.1:8000 --concurrency 1 16 64
+#   python -m benchmarks.compare before.json after.json     # regressions between two result files
+#
+# In-process mode runs the app's lifespan and talks to it through httpx's ASGI transport (no sockets), handy to
+# compare commits. --url measures a real server (gunicorn_conf.py), seeded against the same DATABASE_URL.
+# Settings come from the environment as usual (DATABASE_URL=sqlite:///./bench.db works for a quick run).
+
+
+class Context:
+    def __init__(self, manifest: dict, tokens: list):
+        self.manifest = manifest
+        self.tokens = tokens
+        self.rng = random.Random(1)
+
+    def email(self, i: int) -> str:
+        return self.manifest["emails"][i % len(self.manifest["emails"])]
+
+    def headers(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[i % len(self.tokens)]}"}
+
+    def project(self, i: int) -> str:
+        return self.manifest["project_ids"][i % len(self.manifest["project_ids"])]
+
+    def task(self, i: int) -> str:
+        return self.manifest["task_ids"][i % len(self.manifest["task_ids"])]
+
+    def word(self) -> str:
+        return self.rng.choice(self.manifest["words"])
+
+
+# name -> (ctx, i) -> (method, url, httpx kwargs)
+SCENARIOS = {
+    "signin": lambda ctx, i: ("POST", "/api/v1/auth/signin",
+                              {"data": {"username": ctx.email(i), "password": ctx.manifest["password"]}}),
+    "users_me": lambda ctx, i: ("GET", "/api/v1/users/me", {"headers": ctx.headers(i)}),
+    "project_tasks": lambda ctx, i: ("GET", f"/api/v1/tasks/project/{ctx.project(i)}", {"headers": ctx.headers(i)}),
+    "project_tasks_filtered": lambda ctx, i: ("GET", f"/api/v1/tasks/project/{ctx.project(i)}?status=todo&limit=20",
+                                              {"headers": ctx.headers(i)}),
+    "task_detail": lambda ctx, i: ("GET", f"/api/v1/tasks/{ctx.task(i)}", {"headers": ctx.headers(i)}),
+    "task_comments": lambda ctx, i: ("GET", f"/api/v1/tasks/{ctx.task(i)}/comments", {"headers": ctx.headers(i)}),
+    "my_projects": lambda ctx, i: ("GET", "/api/v1/projects/me/projects", {"headers": ctx.headers(i)}),
+    "project_summary": lambda ctx, i: ("GET", f"/api/v1/projects/{ctx.project(i)}/summary", {"headers": ctx.headers(i)}),
+    "search": lambda ctx, i: ("GET", f"/api/v1/search/?q={ctx.word()}", {"headers": ctx.headers(i)}),
+}
+# bcrypt bound: a fraction of the requests is enough
+SLOW_SCENARIOS = {"signin": 0.1}
+
+
+async def run_level(client: httpx.AsyncClient, name: str, ctx: Context, concurrency: int, total: int) -> dict:
+    scenario = SCENARIOS[name]
+    latencies, errors = [], 0
+    requests = iter(range(total))  # shared by the workers, each request is taken once
+
+    async def worker():
+        nonlocal errors
+        for i in requests:
+            method, url, kwargs = scenario(ctx, i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, concurrency, latencies, errors, time.perf_counter() - start)
+
+
+async def sign_in_all(client: httpx.AsyncClient, manifest: dict) -> list:
+    tokens = []
+    for email in manifest["emails"]:
+        response = await client.post("/api/v1/auth/signin", data={"username": email, "password": manifest["password"]})
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def benchmark(client: httpx.AsyncClient, manifest: dict, args) -> list:
+    ctx = Context(manifest, await sign_in_all(client, manifest))
+    results = []
+    for name in args.scenarios:
+        total = max(int(args.requests * SLOW_SCENARIOS.get(name, 1)), 1)
+        await run_level(client, name, ctx, 1, args.warmup)  # warm caches / pool / compiled statements
+        for concurrency in args.concurrency:
+            result = await run_level(client, name, ctx, concurrency, max(total, concurrency))
+            results.append(result)
+            print(f"{name:24} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+                  f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  errors {result['errors']}")
+    return results
+
+
+async def main(args):
+    if args.seed:
+        manifest = seeding.seed_from_args(args)
+        seeding.write_manifest(manifest, args.manifest)
+    else:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            results = await benchmark(client, manifest, args)
+    else:
+        from main import app
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+                results = await benchmark(client, manifest, args)
+
+    output = args.output or default_output("http")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": metadata(mode="url" if args.url else "asgi", url=args.url, requests=args.requests,
+                                    seed=manifest["sizes"]),
+                   "results": results}, f, indent=2)
+    print(f"results -> {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API hot paths")
+    parser.add_argument("--seed", action="store_true", help="seed fresh data first (see benchmarks/seed.py)")
+    seeding.add_arguments(parser)
+    parser.add_argument("--manifest", default="benchmarks/results/seed.json", help="seed manifest (written with --seed, read otherwise)")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="result file (default benchmarks/results/http-<time>-<commit>.json)")
+    asyncio.run(main(parser.parse_args()))
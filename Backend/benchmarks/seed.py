@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import random
+import uuid
+from config import settings
+from crud import crud_project, crud_tasks, crud_users
+from database import SessionLocal
+from lifecycle import prepare_database
+from schemas import ProjectCreate, ProjectMemberCreate, TaskCommentContent, TaskCreate, UserCreate, UserRole
+from security import get_password_hash
+
+# Benchmark data, written through the crud modules like the API would.
+#   python -m benchmarks.seed --users 20 --projects 5 --tasks-per-project 200 --comments-per-task 2
+# Every run adds its own users (bench-<run>-<n>@example.com, all with BENCH_PASSWORD) who are members of all the
+# seeded projects. Use a database of its own: nothing is cleaned up. Its tables come from create_all on SQLite;
+# on Postgres run `alembic upgrade head` against it first (or set DB_CREATE_ALL=true).
+
+BENCH_PASSWORD = "bench-password"
+WORDS = ["rocket", "budget", "design", "review", "deploy", "invoice", "backend", "onboarding",
+         "migration", "roadmap", "sprint", "release", "customer", "incident", "security", "analytics"]
+STATUSES = ["todo", "in_progress", "review", "done"]
+PRIORITIES = ["high", "medium", "low"]
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def seed(db, users: int = 20, projects: int = 5, tasks_per_project: int = 200, comments_per_task: int = 2,
+         random_seed: int = 0) -> dict:
+    rng = random.Random(random_seed)
+    run = uuid.uuid4().hex[:8]
+    hashed = get_password_hash(BENCH_PASSWORD)  # once, bcrypt isn't what we're seeding
+
+    user_rows = [
+        crud_users.create_user(db, UserCreate(
+            first_name="Bench", last_name=f"User{i}", email=f"bench-{run}-{i}@example.com",
+            password=BENCH_PASSWORD, roles=[UserRole.project_manager],
+        ), hashed_password=hashed)
+        for i in range(users)
+    ]
+    user_ids = [u.id for u in user_rows]
+
+    project_ids, task_ids = [], []
+    for p in range(projects):
+        project = crud_project.create_project(db, ProjectCreate(
+            name=f"Bench {_sentence(rng, 2)} {p}", description=_sentence(rng, 12), created_by=rng.choice(user_ids)))
+        project_ids.append(project.id)
+        for user_id in user_ids:
+            crud_project.invite_project(db, project.id, ProjectMemberCreate(project_id=project.id, user_id=user_id))
+
+        tasks = [
+            TaskCreate(title=_sentence(rng, 4), description=_sentence(rng, 30), project_id=project.id,
+                       created_by=rng.choice(user_ids), assigned_to=rng.choice(user_ids + [None]),
+                       status=rng.choice(STATUSES), priority=rng.choice(PRIORITIES))
+            for _ in range(tasks_per_project)
+        ]
+        for start in range(0, len(tasks), settings.BATCH_MAX_ITEMS):
+            result = crud_tasks.create_tasks_batch(db, tasks[start:start + settings.BATCH_MAX_ITEMS])
+            task_ids += [r["id"] for r in result["results"] if r["ok"]]
+
+    for task_id in task_ids:
+        for _ in range(comments_per_task):
+            crud_tasks.add_comment_to_task(db, task_id, rng.choice(user_ids), TaskCommentContent(content=_sentence(rng, 15)))
+
+    return {
+        "run": run,
+        "password": BENCH_PASSWORD,
+        "emails": [u.email for u in user_rows],
+        "user_ids": [str(u) for u in user_ids],
+        "project_ids": [str(p) for p in project_ids],
+        "task_ids": [str(t) for t in rng.sample(task_ids, min(len(task_ids), 500))],
+        "words": WORDS,
+        "sizes": {"users": users, "projects": projects, "tasks_per_project": tasks_per_project,
+                  "comments_per_task": comments_per_task},
+    }
+
+
+def write_manifest(manifest: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--tasks-per-project", type=int, default=200)
+    parser.add_argument("--comments-per-task", type=int, default=2)
+    parser.add_argument("--random-seed", type=int, default=0)
+
+
+def seed_from_args(args) -> dict:
+    prepare_database()
+    db = SessionLocal()
+    try:
+        return seed(db, args.users, args.projects, args.tasks_per_project, args.comments_per_task, args.random_seed)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed benchmark data through the crud modules")
+    add_arguments(parser)
+    parser.add_argument("--manifest", default="benchmarks/results/seed.json", help="where to write the seeded ids")
+    args = parser.parse_args()
+    manifest = seed_from_args(args)
+    write_manifest(manifest, args.manifest)
+    print(f"seeded run {manifest['run']} -> {args.manifest}")
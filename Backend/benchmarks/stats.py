@@ -0,0 +1,68 @@
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from config import settings
+
+# shared by run.py / micro.py: latency summaries and the metadata that makes two result files comparable
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values) + 0.5) - 1))  # nearest rank
+    return sorted_values[index]
+
+
+# latencies in seconds -> the numbers we keep (milliseconds)
+def summarize(name: str, concurrency: int, latencies: list, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "name": name,
+        "concurrency": concurrency,
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+    }
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def metadata(**extra) -> dict:
+    from database import engine
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "database": engine.dialect.name,
+        "settings": {
+            "DB_ASYNC": settings.DB_ASYNC,
+            "AUTH_STATELESS": settings.AUTH_STATELESS,
+            "DB_POOL_SIZE": settings.DB_POOL_SIZE,
+            "DB_MAX_OVERFLOW": settings.DB_MAX_OVERFLOW,
+            "BCRYPT_ROUNDS": settings.BCRYPT_ROUNDS,
+            "PASSWORD_HASH_WORKERS": settings.PASSWORD_HASH_WORKERS,
+        },
+        **extra,
+    }
+
+
+def default_output(kind: str) -> str:
+    commit = _git("rev-parse", "--short", "HEAD") or "nogit"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(os.path.dirname(__file__), "results", f"{kind}-{stamp}-{commit}.json")
@@ -0,0 +1,139 @@
+import zlib
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: without it we only offer gzip
+    brotli = None
+
+# Negotiated response compression (Accept-Encoding: br / gzip), pure ASGI like instrumentation.py.
+# - bodies under COMPRESSION_MIN_SIZE go out as they are, compressing a few hundred bytes isn't worth the CPU
+# - streamed bodies (the exports, more_body=True) are compressed chunk by chunk and flushed after each chunk,
+#   so the client keeps receiving rows as they are read; SSE (text/event-stream) is never touched
+# - a compressed representation gets Vary: Accept-Encoding and its ETag turns weak (same JSON, other bytes),
+#   If-None-Match keeps working since etag.if_none_match compares weakly
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+THREAD_MINIMUM_SIZE = 128 * 1024  # bigger bodies are compressed off the event loop
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self):
+        self._z = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._z.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self):
+        self._c = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+# the encoding we'll answer with for this Accept-Encoding header (None = identity)
+def negotiate(accept_encoding: str):
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name] = q
+    # our preference: brotli compresses JSON noticeably better than gzip, at the same speed at low quality
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda enc: offered.get(enc, offered.get("*", 0.0)))
+    if offered.get(best, offered.get("*", 0.0)) <= 0:
+        return None
+    return _Brotli if best == "br" else _Gzip
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        compressor_class = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if compressor_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None  # set once we decided to compress
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                passthrough = ("content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES
+                               or message["status"] in (204, 304))
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message  # held back until we see the first body chunk
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                    await send(start_message)
+                    await send(message)
+                    passthrough = True
+                    return
+                compressor = compressor_class()
+                headers = MutableHeaders(raw=start_message.setdefault("headers", []))
+                headers["content-encoding"] = compressor.encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag
+                if not more_body:
+                    # the whole body at once: compress it, send it with its real length
+                    body = await _compress_all(compressor, body)
+                    headers["content-length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["content-length"]  # streamed: chunked transfer
+                await send(start_message)
+
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+async def _compress_all(compressor, body: bytes) -> bytes:
+    if len(body) >= THREAD_MINIMUM_SIZE:
+        return await anyio.to_thread.run_sync(lambda: compressor.compress(body) + compressor.finish())
+    return compressor.compress(body) + compressor.finish()
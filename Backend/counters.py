@@ -0,0 +1,82 @@
+import argparse
+from collections import Counter
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Project, Task, TaskArchive
+
+# Denormalized counters, so a task card / project card shows its counts without loading the comments or tasks:
+# - Task.comment_count
+# - Project.task_count and one <status>_count per task status (todo_count, in_progress_count, review_count, done_count)
+# The task / comment writes in crud_tasks move them in the same transaction as the row they write
+# (count = count + n: atomic under concurrent writers, the parent row stays locked until the commit).
+# They are part of TaskRead / ProjectRead, so changing them moves updated_at (and the ETags) like any other field.
+# A task without a status counts as "todo", same as the dashboard summaries.
+# An archived project's tasks and comments sit in the archive tables (archive.py) and still count: comment_count
+# moves with the task, and the project counters cover both sides.
+# repair() recomputes them from the rows, for data written around the app (psql, imports) or after a bug:
+#   python -m counters
+
+STATUS_COUNTERS = {status: getattr(Project, f"{status}_count") for status in Task.status.type.enums}
+
+
+# UPDATE for a project's counters, changes = {task status: +n / -n}; None when nothing moves
+def project_counts_update(project_id, changes: dict):
+    by_status = Counter()
+    for status, n in changes.items():
+        by_status[status or "todo"] += n
+    values = {STATUS_COUNTERS[status].key: STATUS_COUNTERS[status] + n for status, n in by_status.items() if n}
+    total = sum(by_status.values())
+    if total:
+        values["task_count"] = Project.task_count + total
+    if not values:
+        return None
+    return update(Project).where(Project.id == project_id).values(**values).execution_options(synchronize_session=False)
+
+# the same for several projects: {project_id: {status: n}}, in project id order (concurrent batches lock the
+# project rows in the same order, no deadlock)
+def projects_counts_updates(changes_by_project: dict) -> list:
+    updates = (project_counts_update(project_id, changes) for project_id, changes in sorted(changes_by_project.items()))
+    return [stmt for stmt in updates if stmt is not None]
+
+def comment_count_update(task_id, n: int):
+    return (update(Task).where(Task.id == task_id).values(comment_count=Task.comment_count + n)
+            .execution_options(synchronize_session=False))
+
+
+# Repair: recompute every counter from the rows in bulk, one UPDATE per table (correlated counts through the
+# (task_id, ...) / (project_id, status) indexes), counting both tiers through crud_tasks' all_tasks / all_comments.
+# Only rows whose counters drifted are written.
+def _task_count(all_tasks, *conditions):
+    return select(func.count()).select_from(all_tasks).where(all_tasks.c.project_id == Project.id, *conditions).scalar_subquery()
+
+def repair(db: Session) -> dict:
+    from crud.crud_tasks import all_comments, all_tasks  # (crud_tasks imports this module)
+    fixed_tasks = 0
+    for tasks in (Task.__table__, TaskArchive.__table__):
+        comments = select(func.count()).select_from(all_comments).where(all_comments.c.task_id == tasks.c.id).scalar_subquery()
+        fixed_tasks += db.execute(update(tasks).where(tasks.c.comment_count != comments).values(comment_count=comments)
+                                  .execution_options(synchronize_session=False)).rowcount
+
+    expected = {"task_count": _task_count(all_tasks)}
+    for status, column in STATUS_COUNTERS.items():
+        expected[column.key] = _task_count(all_tasks, func.coalesce(all_tasks.c.status, "todo") == status)
+    drifted = or_(*(getattr(Project, key) != value for key, value in expected.items()))
+    fixed_projects = db.execute(update(Project).where(drifted).values(**expected)
+                                .execution_options(synchronize_session=False)).rowcount
+    db.commit()
+    return {"tasks": fixed_tasks, "projects": fixed_projects}
+
+
+def main(args):
+    db = SessionLocal()
+    try:
+        fixed = repair(db)
+    finally:
+        db.close()
+    print(f"counters repaired: {fixed['tasks']} tasks, {fixed['projects']} projects")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the denormalized task / project counters")
+    main(parser.parse_args())
@@ -0,0 +1,44 @@
+# Async versions of the crud modules.
+# Every crud function is written once against a sync Session; this module exposes the same functions
+# as coroutines (see database.run_db), so routes can simply do `await crud_tasks.get_task_by_id(db, task_id)`
+# whether db is an AsyncSession (settings.DB_ASYNC) or a classic Session.
+
+from crud import crud_project as _crud_project
+from crud import crud_search as _crud_search
+from crud import crud_tasks as _crud_tasks
+from crud import crud_users as _crud_users
+from database import run_db
+from config import settings
+from read_cache import read_cache
+
+
+class AsyncCrud:
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        fn = getattr(self._module, name)
+        namespace = getattr(fn, "read_cache_namespace", None)
+
+        if namespace is not None and settings.READ_CACHE_ENABLED:
+            # @cached reads go through the read-through cache (see read_cache.py); cache_version, when the route
+            # knows it, keeps pages cached for another version of the resource from being served
+            async def call(db, entity, *args, cache_version=None, **kwargs):
+                page = (args, tuple(sorted(kwargs.items())), cache_version)
+                return await read_cache.get_or_load(namespace, entity, page, lambda: run_db(db, fn, entity, *args, **kwargs))
+        elif namespace is not None:
+            async def call(db, *args, cache_version=None, **kwargs):
+                return await run_db(db, fn, *args, **kwargs)
+        else:
+            async def call(db, *args, **kwargs):
+                return await run_db(db, fn, *args, **kwargs)
+
+        call.__name__ = name
+        setattr(self, name, call)  # build each wrapper only once
+        return call
+
+
+crud_project = AsyncCrud(_crud_project)
+crud_search = AsyncCrud(_crud_search)
+crud_tasks = AsyncCrud(_crud_tasks)
+crud_users = AsyncCrud(_crud_users)
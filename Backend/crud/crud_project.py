@@ -1,114 +1,170 @@
+from sqlalchemy import delete, exists, func, insert, select, union, update
 from sqlalchemy.orm import Session
-from schemas import ProjectBase, ProjectCreate, ProjectMemberCreate, ProjectMemberRead
+from schemas import ProjectBase, ProjectCreate, ProjectMemberCreate, ProjectMemberRead, ProjectFilter, ProjectRead, UserRead
 from models import Project as ProjectModel 
 from models import ProjectMember, User
 from uuid import UUID
+from typing import Optional
+from pagination import paginate
+from config import settings
+from database import execute_returning
+from fastjson import schema_columns
+from ttl_cache import TTLCache
+from read_cache import cached, invalidate
+import events
+
+# list pages are plain rows of the Read schema's columns, no ORM objects (see fastjson.py)
+PROJECT_COLUMNS = schema_columns(ProjectRead, ProjectModel)
+USER_COLUMNS = schema_columns(UserRead, User)
+
+# Project-level access: a user may see the projects they're a member of or created (admins see all of them).
+# The set of project ids is cached per user; it's filled by the auth lookup (crud_users.get_user_with_projects)
+# and dropped here whenever a membership changes (on every worker, events.broadcast_invalidation), so the check
+# costs no query on a warm cache.
+project_access_cache = TTLCache(settings.PROJECT_ACCESS_CACHE_SIZE, settings.PROJECT_ACCESS_CACHE_TTL_SECONDS)
+events.on_invalidate("project_access", lambda key: project_access_cache.invalidate(UUID(key)), project_access_cache.clear)
+
+def _forget_access(user_id: UUID):
+    project_access_cache.invalidate(user_id)
+    events.broadcast_invalidation("project_access", user_id)
+
+# (project_id, user_id) pairs granting access
+project_access = union(
+    select(ProjectMember.project_id.label("project_id"), ProjectMember.user_id.label("user_id")),
+    select(ProjectModel.id.label("project_id"), ProjectModel.created_by.label("user_id")),
+).subquery("project_access")
+
+def get_accessible_project_ids(db: Session, user_id: UUID) -> frozenset:
+    project_ids = project_access_cache.get(user_id)
+    if project_ids is None:
+        project_ids = frozenset(db.scalars(select(project_access.c.project_id).where(project_access.c.user_id == user_id)))
+        project_access_cache.set(user_id, project_ids)
+    return project_ids
+
+
+def get_all_project(db: Session, filters: Optional[ProjectFilter] = None,
+                    cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    query = db.query(*PROJECT_COLUMNS)
+    if filters and filters.status is not None:
+        query = query.filter(ProjectModel.status == filters.status)
+    return paginate(query, (ProjectModel.created_at, ProjectModel.id), cursor, limit)
+
+# (a row of ProjectRead's columns, like the lists; cached, see read_cache.py)
+@cached("project")
+def get_project_by_id(db:Session, project_id : UUID):
+    return db.query(*PROJECT_COLUMNS).filter(ProjectModel.id == project_id).first()
 
+# version token for ETags: when the project last changed (None if it doesn't exist)
+def get_project_version(db: Session, project_id: UUID):
+    row = db.query(func.coalesce(ProjectModel.updated_at, ProjectModel.created_at)).filter(ProjectModel.id == project_id).first()
+    return row[0] if row else None
 
-def get_all_project(db: Session):
-    return db.query(ProjectModel).all()
-
-def get_project_by_id(db:Session, project_id : UUID):
-    return db.query(ProjectModel).filter(ProjectModel.id == project_id).first()    
 
+# Write paths: each one is a single INSERT / UPDATE / DELETE ... RETURNING plus the commit (database.execute_returning).
+# A missing project comes back as "no row returned", a missing user as a foreign key violation, both map to None.
+# Once committed they drop the cached reads they changed (read_cache.invalidate).
 
+# (None if created_by is not a user)
 def create_project(db: Session, project: ProjectCreate):
-    db_project = ProjectModel(**project.model_dump())
-    db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    row = execute_returning(db, insert(ProjectModel).values(**project.model_dump()).returning(ProjectModel))
+    if not row:
+        return None
+    _forget_access(project.created_by)
+    return row[0]
 
 def update_project(db:Session, project_id: UUID, project_update: ProjectBase):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    if not db_project:
-        return None
     update_data = project_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_project, key, value)
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    if not update_data:
+        return get_project_by_id(db, project_id)
+    row = execute_returning(db, update(ProjectModel).where(ProjectModel.id == project_id).values(**update_data).returning(ProjectModel))
+    if not row:
+        return None
+    invalidate("project", project_id)
+    return row[0]
 
 def delete_project(db:Session, project_id: UUID):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    if not db_project:
+    row = execute_returning(db, delete(ProjectModel).where(ProjectModel.id == project_id).returning(ProjectModel),
+                            in_use="project still has tasks or members")
+    if not row:
         return None
-    db.delete(db_project)
-    db.commit()
-    return db_project
+    invalidate("project", project_id)
+    invalidate("members", project_id)
+    return row[0]
 
-# archive function
+# archive function (archive.py then moves its tasks to the archive tables)
 def archive_project(db: Session, project_id: UUID):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    if not db_project:
+    row = execute_returning(db, update(ProjectModel).where(ProjectModel.id == project_id).values(status="archived").returning(ProjectModel))
+    if not row:
+        return None
+    invalidate("project", project_id)
+    return row[0]
+
+# back to active (archive.py moves its tasks back to the hot tables)
+def unarchive_project(db: Session, project_id: UUID):
+    row = execute_returning(db, update(ProjectModel).where(ProjectModel.id == project_id).values(status="active").returning(ProjectModel))
+    if not row:
         return None
-    db_project.status = "archived"
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    invalidate("project", project_id)
+    return row[0]
 
-# a member joins a project
+# a member joins a project (the one in the URL; None if the project or the user doesn't exist)
 def  invite_project(db:Session, project_id: UUID, project_member_details: ProjectMemberCreate):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    db_user = db.query(User).filter(User.id == project_member_details.user_id).first()
-    if not db_project or not db_user:
+    values = {**project_member_details.model_dump(), "project_id": project_id}
+    row = execute_returning(db, insert(ProjectMember).values(**values).returning(ProjectMember))
+    if not row:
         return None
-    project_member_new = ProjectMember(**project_member_details.model_dump())
-    db.add(project_member_new)
-    db.commit()
-    db.refresh(project_member_new)
-    return project_member_new
+    _forget_access(project_member_details.user_id)
+    invalidate("members", project_id)
+    return row[0]
+
+# does a row with this primary key exist? (id only, doesn't load the row)
+def row_exists(db: Session, model, row_id: UUID) -> bool:
+    return db.query(model.id).filter(model.id == row_id).first() is not None
+
+# The list functions below are a single query each (a join / anti-join through the relationships in models.py).
+# An empty page is ambiguous (no rows, or no such project/user?), only then do we pay for the existence check.
 
 # get project members of a project:
-def get_project_members(db: Session, project_id: UUID):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    if not db_project:
+# (users have no created_at column, so user lists are paged on id alone; cached, see read_cache.py)
+@cached("members")
+def get_project_members(db: Session, project_id: UUID, cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    query = db.query(*USER_COLUMNS).join(User.memberships).filter(ProjectMember.project_id == project_id)
+    page = paginate(query, (User.id,), cursor, limit)
+    if not page["items"] and not row_exists(db, ProjectModel, project_id):
         return None
-    memberships = db.query(ProjectMember).filter(ProjectMember.project_id == project_id).all()
-    user_ids = [m.user_id for m in memberships]
-    users = db.query(User).filter(User.id.in_(user_ids)).all()
-    return users
+    return page
 
 
 # get joined projects for a user
-def get_my_projects(db: Session, user_id: UUID):
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if not db_user:
+def get_my_projects(db: Session, user_id: UUID, cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    query = db.query(*PROJECT_COLUMNS).join(ProjectModel.members).filter(ProjectMember.user_id == user_id)
+    page = paginate(query, (ProjectModel.created_at, ProjectModel.id), cursor, limit)
+    if not page["items"] and not row_exists(db, User, user_id):
         return None
-
-    # Step 1: Get all project memberships for the user
-    memberships = db.query(ProjectMember).filter(ProjectMember.user_id == user_id).all()
-
-    project_ids = [m.project_id for m in memberships]
-    # Step 2: Get all projects with those IDs
-    projects = db.query(ProjectModel).filter(ProjectModel.id.in_(project_ids)).all()
-    return projects
+    return page
 
 # get available users to invite (users not already in the project)
-def get_available_users(db: Session, project_id: UUID):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    if not db_project:
+def get_available_users(db: Session, project_id: UUID, cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    # NOT EXISTS anti-join; the EXISTS on projects makes an unknown project come back as an empty page
+    query = db.query(*USER_COLUMNS).filter(
+        ~User.memberships.any(ProjectMember.project_id == project_id),
+        exists().where(ProjectModel.id == project_id),
+    )
+    page = paginate(query, (User.id,), cursor, limit)
+    if not page["items"] and not row_exists(db, ProjectModel, project_id):
         return None
-
-    # Get all user IDs already in the project
-    memberships = db.query(ProjectMember).filter(ProjectMember.project_id == project_id).all()
-    member_ids = [m.user_id for m in memberships]
-
-    # Get all users not in the project
-    available_users = db.query(User).filter(~User.id.in_(member_ids)).all()
-    return available_users
+    return page
 
 # remove a member from a project
 def remove_project_member(db: Session, project_id: UUID, user_id: UUID):
-    membership = db.query(ProjectMember).filter(
+    row = execute_returning(db, delete(ProjectMember).where(
         ProjectMember.project_id == project_id,
         ProjectMember.user_id == user_id
-    ).first()
-
-    if not membership:
+    ).returning(ProjectMember))
+    if not row:
         return None
-
-    db.delete(membership)
-    db.commit()
-    return membership
\ No newline at end of file
+    _forget_access(user_id)
+    invalidate("members", project_id)
+    # (open feeds re-check their caller's access on it, routers/feed.py)
+    events.publish("member.removed", project_id, {"user_id": str(user_id)})
+    return row[0]
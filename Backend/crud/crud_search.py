@@ -0,0 +1,121 @@
+from uuid import UUID
+from typing import Optional
+from sqlalchemy import Float, String, and_, cast, func, literal, select, union, union_all
+from sqlalchemy.orm import Session
+from models import Project as ProjectModel
+from models import ProjectMember
+from models import Task as TaskModel
+from models import TaskArchive, TaskComment, TaskCommentArchive
+from schemas import SearchFilter, SearchKind
+from pagination import paginate
+from config import settings
+import fulltext
+
+# Ranked full-text search (see fulltext.py for the indexes).
+# Every kind of hit is shaped the same (kind, id, project_id, title, snippet, neg_rank), the union is paged on
+# (neg_rank, id): best match first, and the cursor stays valid while rows are added.
+# Tasks and comments are searched in both tiers, the hot tables and the archive (archive.py), like all_tasks /
+# all_comments read them: a task is on exactly one side, so it's found once wherever it is.
+
+# (tasks, their comments) per tier
+TIERS = ((TaskModel, TaskComment), (TaskArchive, TaskCommentArchive))
+
+SNIPPET_CHARS = 200
+
+
+# projects the user may search: the ones they're a member of or created. None = no restriction (admins).
+def _project_scope(user_id: Optional[UUID]):
+    if user_id is None:
+        return None
+    return union(
+        select(ProjectMember.project_id).where(ProjectMember.user_id == user_id),
+        select(ProjectModel.id).where(ProjectModel.created_by == user_id),
+    )
+
+def _restrict(stmt, project_column, filters: SearchFilter, scope):
+    if scope is not None:
+        stmt = stmt.where(project_column.in_(scope))
+    if filters.project_id is not None:
+        stmt = stmt.where(project_column == filters.project_id)
+    return stmt
+
+def _snippet(text_column):
+    return func.substr(text_column, 1, SNIPPET_CHARS).label("snippet")
+
+
+def _postgres_hits(filters: SearchFilter, scope):
+    query = fulltext.pg_query(filters.q)
+
+    def matching(kind: str, table_name: str):
+        vector = fulltext.search_vector(table_name)
+        # ts_rank is a float4: cast, so the value that round-trips through the cursor is exactly the one compared
+        neg_rank = (-cast(func.ts_rank(vector, query), Float)).label("neg_rank")
+        return literal(kind, String).label("kind"), neg_rank, vector.op("@@")(query)
+
+    parts = []
+    if filters.kind in (None, SearchKind.task):
+        for tasks, _ in TIERS:
+            kind, neg_rank, match = matching("task", tasks.__tablename__)
+            parts.append(_restrict(
+                select(kind, tasks.id, tasks.project_id, tasks.title.label("title"),
+                       _snippet(tasks.description), neg_rank).where(match),
+                tasks.project_id, filters, scope))
+    if filters.kind in (None, SearchKind.project):
+        kind, neg_rank, match = matching("project", "projects")
+        parts.append(_restrict(
+            select(kind, ProjectModel.id, ProjectModel.id.label("project_id"), ProjectModel.name.label("title"),
+                   _snippet(ProjectModel.description), neg_rank).where(match),
+            ProjectModel.id, filters, scope))
+    if filters.kind in (None, SearchKind.comment):
+        for tasks, comments in TIERS:
+            kind, neg_rank, match = matching("comment", comments.__tablename__)
+            parts.append(_restrict(
+                select(kind, comments.id, tasks.project_id, tasks.title.label("title"),
+                       _snippet(comments.content), neg_rank)
+                .join(tasks, tasks.id == comments.task_id).where(match),
+                tasks.project_id, filters, scope))
+    return union_all(*parts) if len(parts) > 1 else parts[0]
+
+
+def _sqlite_hits(filters: SearchFilter, scope):
+    fts_query = fulltext.sqlite_query(filters.q)
+    if fts_query is None:
+        return None
+    indexes = (fulltext.sqlite_search_index, fulltext.sqlite_archive_search_index)
+    return union_all(*(_sqlite_tier_hits(index, tasks, comments, fts_query, filters, scope)
+                       for index, (tasks, comments) in zip(indexes, TIERS)))
+
+def _sqlite_tier_hits(index, tasks, comments, fts_query: str, filters: SearchFilter, scope):
+    stmt = (
+        select(index.c.kind, index.c.id, index.c.project_id,
+               func.coalesce(index.c.title, tasks.title).label("title"),  # a comment shows its task's title
+               _snippet(index.c.body), fulltext.sqlite_rank(index.name).label("neg_rank"))
+        .select_from(
+            index.outerjoin(comments, and_(index.c.kind == "comment", comments.id == index.c.id))
+            .outerjoin(tasks, tasks.id == comments.task_id)
+        )
+        .where(fulltext.sqlite_match(fts_query, index.name))
+    )
+    if filters.kind is not None:
+        stmt = stmt.where(index.c.kind == filters.kind.value)
+    return _restrict(stmt, index.c.project_id, filters, scope)
+
+
+def search(db: Session, filters: SearchFilter, user_id: Optional[UUID] = None,
+           cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    scope = _project_scope(user_id)
+    if db.get_bind().dialect.name == "sqlite":
+        hits = _sqlite_hits(filters, scope)
+    else:
+        hits = _postgres_hits(filters, scope)
+    if hits is None:
+        return {"items": [], "next_cursor": None}
+
+    hits = hits.subquery("hits")
+    page = paginate(db.query(hits), (hits.c.neg_rank, hits.c.id), cursor, limit)
+    page["items"] = [
+        {"kind": hit.kind, "id": hit.id, "project_id": hit.project_id, "title": hit.title,
+         "snippet": hit.snippet, "rank": -hit.neg_rank}
+        for hit in page["items"]
+    ]
+    return page
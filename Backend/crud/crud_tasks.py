@@ -1,101 +1,433 @@
 from models import Task as TaskModel
-from models import TaskComment
 from models import Project as ProjectModel
 from models import User as UserModel
 from models import TaskComment
-from schemas import TaskCreate, TaskBase, TaskCommentContent, TaskCommentRead
+from models import TaskArchive, TaskCommentArchive
+from schemas import TaskCreate, TaskBase, TaskCommentContent, TaskCommentRead, TaskFilter, TaskBatchUpdateItem, TaskAssignment, TaskRead
 from uuid import UUID
+import uuid
+from typing import List, Optional
+from sqlalchemy import and_, bindparam, delete, exists, func, insert, literal, literal_column, select, union_all, update
 from sqlalchemy.orm import Session
+from pagination import paginate
+from database import execute_returning
+from fastjson import schema_columns
+from ttl_cache import TTLCache
+from read_cache import cached, invalidate
+from config import settings
+import events
+import counters
+
+
+# Hot and archive tables (archive.py): an archived project's tasks and comments live in tasks_archive /
+# task_comments_archive, and move back when it's unarchived. The reads go through both sides as one UNION ALL,
+# a single statement, so a move committing in between can't hide a row. The planner pushes the WHERE, the
+# keyset and the LIMIT into each side: an active project's read costs one more (empty) index probe.
+def _both_tiers(hot, archived, name: str):
+    fields = [column.key for column in hot.__table__.columns]
+    return union_all(
+        select(*(hot.__table__.c[field] for field in fields)),
+        select(*(archived.__table__.c[field] for field in fields)),
+    ).subquery(name)
+
+all_tasks = _both_tiers(TaskModel, TaskArchive, "all_tasks")
+all_comments = _both_tiers(TaskComment, TaskCommentArchive, "all_comments")
 
+# list pages are plain rows of the Read schema's columns, no ORM objects (see fastjson.py).
+# (labelled: a subquery's own column names come back as a str subclass that orjson won't take as a key)
+TASK_COLUMNS = [column.label(column.key) for column in schema_columns(TaskRead, all_tasks.c)]
+COMMENT_COLUMNS = [column.label(column.key) for column in schema_columns(TaskCommentRead, all_comments.c)]
 
+# task id -> project id for the project access check (dependencies.require_task_access).
+# A task never moves to another project, so the entry can't go stale (a deleted task simply 404s afterwards).
+task_project_cache = TTLCache(settings.PROJECT_ACCESS_CACHE_SIZE, settings.PROJECT_ACCESS_CACHE_TTL_SECONDS)
 
+def get_task_project_id(db: Session, task_id: UUID):
+    project_id = task_project_cache.get(task_id)
+    if project_id is None:
+        project_id = db.scalar(select(all_tasks.c.project_id).where(all_tasks.c.id == task_id))
+        if project_id is not None:
+            task_project_cache.set(task_id, project_id)
+    return project_id
+
+# (a row of TaskRead's columns, like the lists; cached, see read_cache.py)
+@cached("task")
 def get_task_by_id(db:Session, task_id: UUID):
-    task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-    if not task:
-        return None
-    return task
+    return db.query(*TASK_COLUMNS).filter(all_tasks.c.id == task_id).first()
+
+# Version tokens for ETags, cheap aggregates instead of loading rows (see etag.py)
 
-def get_tasks_by_projetId(db:Session, project_id: UUID):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == project_id).first()
-    if not db_project :
+def get_task_version(db: Session, task_id: UUID):
+    t = all_tasks.c
+    row = db.query(func.coalesce(t.updated_at, t.created_at)).filter(t.id == task_id).first()
+    return row[0] if row else None
+
+# (project version, number of tasks, latest task change): any insert, update or delete in the project changes it
+def get_tasks_version(db: Session, project_id: UUID):
+    t = all_tasks.c
+    project_version = select(func.coalesce(ProjectModel.updated_at, ProjectModel.created_at)).where(ProjectModel.id == project_id).scalar_subquery()
+    return tuple(db.execute(
+        select(project_version, func.count(t.id), func.max(func.coalesce(t.updated_at, t.created_at)))
+        .where(t.project_id == project_id)
+    ).one())
+
+def get_comments_version(db: Session, task_id: UUID):
+    t, c = all_tasks.c, all_comments.c
+    task_version = select(func.coalesce(t.updated_at, t.created_at)).where(t.id == task_id).scalar_subquery()
+    return tuple(db.execute(
+        select(task_version, func.count(c.id), func.max(func.coalesce(c.updated_at, c.created_at)))
+        .where(c.task_id == task_id)
+    ).one())
+
+def get_tasks_by_projetId(db:Session, project_id: UUID, filters: Optional[TaskFilter] = None,
+                          cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    t = all_tasks.c
+    query = db.query(*TASK_COLUMNS).filter(t.project_id == project_id)
+    if filters:
+        query = filter_tasks(query, filters)
+    page = paginate(query, (t.created_at, t.id), cursor, limit)
+    # an empty page may mean "no such project", only then is it worth checking
+    if not page["items"] and not db.query(ProjectModel.id).filter(ProjectModel.id == project_id).first():
         return None
-    return db.query(TaskModel).filter(TaskModel.project_id == project_id).all()
+    return page
 
-def create_task(db:Session, task: TaskCreate):
-    db_project = db.query(ProjectModel).filter(ProjectModel.id == task.project_id).first()
-    db_creator = db.query(UserModel).filter(UserModel.id == task.created_by).first()
+# apply the optional TaskFilter fields as WHERE clauses
+def filter_tasks(query, filters: TaskFilter):
+    t = all_tasks.c
+    if filters.status is not None:
+        query = query.filter(t.status == filters.status)
+    if filters.priority is not None:
+        query = query.filter(t.priority == filters.priority)
+    if filters.assigned_to is not None:
+        query = query.filter(t.assigned_to == filters.assigned_to)
+    if filters.due_after is not None:
+        query = query.filter(t.due_date >= filters.due_after)
+    if filters.due_before is not None:
+        query = query.filter(t.due_date <= filters.due_before)
+    return query
+
+# Write paths: one INSERT / UPDATE / DELETE ... RETURNING plus the commit each (database.execute_returning).
+# A missing task or comment means no row comes back, a missing project or user is a foreign key violation;
+# both end up as None, which the routes turn into a 404. They only touch the hot tables: archived tasks and
+# their comments are read-only (404) until the project is unarchived. Once committed they drop the cached reads they changed.
 
-    if not db_project or not db_creator:
+def create_task(db:Session, task: TaskCreate):
+    row = execute_returning(db, insert(TaskModel).values(**task.model_dump(exclude_unset=True)).returning(TaskModel),
+                            then=lambda row: [counters.project_counts_update(row[0].project_id, {row[0].status: 1})])
+    if not row:
         return None
-    
-    task_added = TaskModel(**task.model_dump(exclude_unset=True))
-    db.add(task_added)
-    db.commit()
-    db.refresh(task_added)
+    task_added = row[0]
+    task_project_cache.set(task_added.id, task_added.project_id)
+    invalidate("project", task_added.project_id)
+    events.publish("task.created", task_added.project_id, task_added, TaskRead)
     return task_added
 
 def update_task(db:Session, task_id: UUID, task_update: TaskBase):
-    db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-    if not db_task:
-        return None
     update_data = task_update.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_task, key, value)
-    db.commit()
-    db.refresh(db_task)
+    if not update_data:
+        return get_task_by_id(db, task_id)
+    then = None
+    if "status" in update_data:
+        # the project's counters move from the old status to the new one: lock the task and read the old status first
+        old_status = db.scalars(select(TaskModel.status).where(TaskModel.id == task_id).with_for_update()).first()
+        then = lambda row: [counters.project_counts_update(row[0].project_id, {old_status: -1, row[0].status: 1})]
+    row = execute_returning(db, update(TaskModel).where(TaskModel.id == task_id).values(**update_data).returning(TaskModel), then=then)
+    if not row:
+        return None
+    db_task = row[0]
+    invalidate("task", task_id)
+    if then is not None:
+        invalidate("project", db_task.project_id)
+    events.publish("task.updated", db_task.project_id, db_task, TaskRead)
     return db_task 
 
 def delete_task(db:Session, task_id: UUID):
-    db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-    if not db_task:
+    # a task that still has comments hits the foreign key: StillReferenced, a 409 (see execute_returning)
+    row = execute_returning(db, delete(TaskModel).where(TaskModel.id == task_id).returning(TaskModel),
+                            then=lambda row: [counters.project_counts_update(row[0].project_id, {row[0].status: -1})],
+                            in_use="task has comments")
+    if not row:
         return None
-    db.delete(db_task)
-    db.commit()
+    db_task = row[0]
+    invalidate("task", task_id)
+    invalidate("comments", task_id)
+    invalidate("project", db_task.project_id)
+    events.publish("task.deleted", db_task.project_id, {"id": db_task.id})
     return db_task
 
 
 # assign task to user
 def assign_task_to_user(db: Session, task_id: UUID, user_id: UUID):
-    db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
-    if not db_task or not db_user:
+    row = execute_returning(db, update(TaskModel).where(TaskModel.id == task_id).values(assigned_to=user_id).returning(TaskModel))
+    if not row:
         return None
-    db_task.assigned_to = user_id
-    db.commit()
-    db.refresh(db_task)
+    db_task = row[0]
+    invalidate("task", task_id)
+    events.publish("task.assigned", db_task.project_id, db_task, TaskRead)
     return db_task
 
 
+# the project of the comment's task, fetched by the same INSERT / UPDATE (for the change feed event).
+# (spelled out as a literal column: SQLAlchemy doesn't correlate a subquery in RETURNING with the target table)
+_comment_project_id = (
+    select(TaskModel.project_id).where(TaskModel.id == literal_column("task_comments.task_id")).scalar_subquery().label("project_id")
+)
+
 # add comment to a task
 def add_comment_to_task(db:Session, task_id:UUID, user_id: UUID, comment:TaskCommentContent):
-    db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
-    if not db_task or not db_user:
-        return None
-    db_comment = TaskComment(
+    row = execute_returning(db, insert(TaskComment).values(
         user_id = user_id,
         task_id = task_id,
-        **comment.model_dump())
-    db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+        **comment.model_dump()).returning(TaskComment, _comment_project_id),
+        then=lambda row: [counters.comment_count_update(task_id, 1)])
+    if not row:
+        return None
+    db_comment, project_id = row
+    invalidate("comments", task_id)
+    invalidate("task", task_id)
+    events.publish("comment.created", project_id, db_comment, TaskCommentRead)
     return db_comment
 
-# get comments by task_id
-def get_comment_by_taskId(db:Session, task_id:UUID):
-    db_task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
-    if not db_task:
+# get comments by task_id (cached, see read_cache.py)
+@cached("comments")
+def get_comment_by_taskId(db:Session, task_id:UUID, cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    c = all_comments.c
+    query = db.query(*COMMENT_COLUMNS).filter(c.task_id == task_id)
+    page = paginate(query, (c.created_at, c.id), cursor, limit)
+    if not page["items"] and not db.query(all_tasks.c.id).filter(all_tasks.c.id == task_id).first():
         return None
-    return db.query(TaskComment).filter(TaskComment.task_id == task_id).all()   
+    return page
 
 #Update comment
 def update_comment(db:Session, comment_id: UUID, content_update: TaskCommentContent):
-    db_comment = db.query(TaskComment).filter(TaskComment.id == comment_id).first()
-    if not db_comment:
+    row = execute_returning(db, update(TaskComment).where(TaskComment.id == comment_id)
+                            .values(**content_update.model_dump()).returning(TaskComment, _comment_project_id))
+    if not row:
         return None
-    update_content_dict = content_update.model_dump()
-    for key, value in update_content_dict.items():
-        setattr(db_comment, key, value)
+    db_comment, project_id = row
+    invalidate("comments", db_comment.task_id)
+    events.publish("comment.updated", project_id, db_comment, TaskCommentRead)
+    return db_comment    
+
+# Exports: plain SELECTs over the Read schema's columns, in a stable order. The caller streams them
+# with a server-side cursor (routers/export.py), nothing here loads the whole project.
+def export_tasks_query(project_id: UUID):
+    t = all_tasks.c
+    return select(*TASK_COLUMNS).where(t.project_id == project_id).order_by(t.created_at, t.id)
+
+def export_comments_query(project_id: UUID):
+    t, c = all_tasks.c, all_comments.c
+    return (
+        select(*COMMENT_COLUMNS)
+        .join(all_tasks, t.id == c.task_id)
+        .where(t.project_id == project_id)
+        .order_by(c.created_at, c.id)
+    )
+
+# Batch operations
+# Each batch validates every referenced project / user / task with one query, writes all the valid items with a
+# single multi-row statement and commits once. Invalid items are reported back instead of failing the whole batch.
+
+# one "tasks.changed" event per project with the ids that changed, clients refetch what they display
+def _publish_changed(event_type: str, task_projects: dict):
+    by_project = {}
+    for task_id, project_id in task_projects.items():
+        by_project.setdefault(project_id, []).append(str(task_id))
+    for project_id, ids in by_project.items():
+        events.publish("tasks.changed", project_id, {"action": event_type, "ids": ids})
+
+def _batch_result(results: list) -> dict:
+    results.sort(key=lambda r: r["index"])
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+# which of these project ids and user ids exist, in one round-trip
+def _existing_refs(db: Session, project_ids: set, user_ids: set):
+    queries = []
+    if project_ids:
+        queries.append(select(ProjectModel.id, literal("project")).where(ProjectModel.id.in_(project_ids)))
+    if user_ids:
+        queries.append(select(UserModel.id, literal("user")).where(UserModel.id.in_(user_ids)))
+    if not queries:
+        return set(), set()
+    rows = db.execute(union_all(*queries)).all()
+    return {row[0] for row in rows if row[1] == "project"}, {row[0] for row in rows if row[1] == "user"}
+
+# project counters (counters.py) for a batch: changes = {project_id: {status: +n / -n}}
+def _count_change(changes: dict, project_id, status, n: int):
+    per_project = changes.setdefault(project_id, {})
+    per_project[status] = per_project.get(status, 0) + n
+
+# (inside the batch's transaction, before its commit)
+def _apply_count_changes(db: Session, changes: dict):
+    for stmt in counters.projects_counts_updates(changes):
+        db.execute(stmt)
+
+def create_tasks_batch(db: Session, tasks: List[TaskCreate]):
+    project_ids = {t.project_id for t in tasks}
+    user_ids = {t.created_by for t in tasks} | {t.assigned_to for t in tasks if t.assigned_to}
+    known_projects, known_users = _existing_refs(db, project_ids, user_ids)
+
+    results, rows = [], []
+    for index, task in enumerate(tasks):
+        if task.project_id not in known_projects:
+            results.append({"index": index, "ok": False, "error": "project not found"})
+        elif task.created_by not in known_users or (task.assigned_to and task.assigned_to not in known_users):
+            results.append({"index": index, "ok": False, "error": "user not found"})
+        else:
+            row = {"id": uuid.uuid4(), **task.model_dump()}  # full dump: every row of an executemany needs the same keys
+            rows.append(row)
+            results.append({"index": index, "ok": True, "id": row["id"]})
+    if rows:
+        changes = {}
+        for row in rows:
+            _count_change(changes, row["project_id"], row["status"], 1)
+        db.execute(insert(TaskModel), rows)
+        _apply_count_changes(db, changes)
+        db.commit()
+        invalidate("project", *changes)
+        _publish_changed("created", {row["id"]: row["project_id"] for row in rows})
+    return _batch_result(results)
+
+def update_tasks_batch(db: Session, items: List[TaskBatchUpdateItem]):
+    task_ids = {item.id for item in items}
+    assignees = {item.assigned_to for item in items if item.assigned_to}
+    # locked: the status counters move from these statuses (see update_task)
+    found = db.execute(select(TaskModel.id, TaskModel.project_id, TaskModel.status)
+                       .where(TaskModel.id.in_(task_ids)).with_for_update()).all()
+    known_tasks = {task_id: project_id for task_id, project_id, _ in found}
+    statuses = {task_id: status for task_id, _, status in found}
+    _, known_users = _existing_refs(db, set(), assignees)
+
+    results, rows, changes = [], [], {}
+    for index, item in enumerate(items):
+        if item.id not in known_tasks:
+            results.append({"index": index, "ok": False, "id": item.id, "error": "task not found"})
+        elif item.assigned_to and item.assigned_to not in known_users:
+            results.append({"index": index, "ok": False, "id": item.id, "error": "user not found"})
+        else:
+            row = {"id": item.id, **item.model_dump(exclude_unset=True, exclude={"id"})}
+            if "status" in row:
+                _count_change(changes, known_tasks[item.id], statuses[item.id], -1)
+                _count_change(changes, known_tasks[item.id], row["status"], 1)
+                statuses[item.id] = row["status"]  # (the same task may come twice in a batch)
+            rows.append(row)
+            results.append({"index": index, "ok": True, "id": item.id})
+    _bulk_update(db, rows, changes)
+    _publish_changed("updated", {row["id"]: known_tasks[row["id"]] for row in rows})
+    return _batch_result(results)
+
+def assign_tasks_batch(db: Session, assignments: List[TaskAssignment]):
+    task_ids = {a.task_id for a in assignments}
+    known_tasks = dict(db.execute(select(TaskModel.id, TaskModel.project_id).where(TaskModel.id.in_(task_ids))).all())
+    _, known_users = _existing_refs(db, set(), {a.user_id for a in assignments})
+
+    results, rows = [], []
+    for index, assignment in enumerate(assignments):
+        if assignment.task_id not in known_tasks:
+            results.append({"index": index, "ok": False, "id": assignment.task_id, "error": "task not found"})
+        elif assignment.user_id not in known_users:
+            results.append({"index": index, "ok": False, "id": assignment.task_id, "error": "user not found"})
+        else:
+            rows.append({"id": assignment.task_id, "assigned_to": assignment.user_id})
+            results.append({"index": index, "ok": True, "id": assignment.task_id})
+    _bulk_update(db, rows)
+    _publish_changed("assigned", {row["id"]: known_tasks[row["id"]] for row in rows})
+    return _batch_result(results)
+
+# UPDATE tasks SET ... WHERE id = :id as one executemany per distinct set of columns, then a single commit
+# (with the project counter changes, if any)
+def _bulk_update(db: Session, rows: list, count_changes: Optional[dict] = None):
+    if not rows:
+        return
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    table = TaskModel.__table__
+    for columns, group in groups.items():
+        values = {c: bindparam(f"v_{c}") for c in columns if c != "id"}  # (bind names can't clash with column names)
+        values["updated_at"] = func.now()
+        stmt = update(table).where(table.c.id == bindparam("v_id")).values(values)
+        db.execute(stmt, [{f"v_{c}": v for c, v in row.items()} for row in group])
+    _apply_count_changes(db, count_changes or {})
     db.commit()
-    db.refresh(db_comment)
-    return db_comment    
\ No newline at end of file
+    invalidate("task", *(row["id"] for row in rows))
+    invalidate("project", *(count_changes or {}))
+
+def delete_tasks_batch(db: Session, task_ids: List[UUID]):
+    # tasks that still have comments are kept (same rule as delete_task, which hits the foreign key)
+    removed = db.execute(
+        delete(TaskModel)
+        .where(TaskModel.id.in_(set(task_ids)), ~exists().where(TaskComment.task_id == TaskModel.id))
+        .returning(TaskModel.id, TaskModel.project_id, TaskModel.status)
+    ).all()
+    deleted = {task_id: project_id for task_id, project_id, _ in removed}
+    changes = {}
+    for _, project_id, status in removed:
+        _count_change(changes, project_id, status, -1)
+    _apply_count_changes(db, changes)
+    kept = set(db.scalars(select(TaskModel.id).where(TaskModel.id.in_(set(task_ids) - deleted.keys()))))
+    db.commit()
+    invalidate("task", *deleted)
+    invalidate("comments", *deleted)
+    invalidate("project", *changes)
+    _publish_changed("deleted", deleted)
+
+    results = []
+    for index, task_id in enumerate(task_ids):
+        if task_id in deleted:
+            results.append({"index": index, "ok": True, "id": task_id})
+        elif task_id in kept:
+            results.append({"index": index, "ok": False, "id": task_id, "error": "task has comments"})
+        else:
+            results.append({"index": index, "ok": False, "id": task_id, "error": "task not found"})
+    return _batch_result(results)
+
+
+# Dashboard aggregates: counts come straight from GROUP BY queries (over both sides, all_tasks), no task row is loaded
+
+_is_open = all_tasks.c.status != "done"
+_is_overdue = and_(all_tasks.c.due_date < func.current_date(), _is_open)
+
+# {status: n} and {priority: n} (every known value present, zeros included) + total + overdue, out of one GROUP BY
+def _count_breakdown(db: Session, condition) -> dict:
+    rows = db.execute(
+        select(all_tasks.c.status, all_tasks.c.priority, func.count(), func.count().filter(_is_overdue))
+        .where(condition)
+        .group_by(all_tasks.c.status, all_tasks.c.priority)
+    ).all()
+    by_status = dict.fromkeys(TaskModel.status.type.enums, 0)
+    by_priority = dict.fromkeys(TaskModel.priority.type.enums, 0)
+    total = overdue = 0
+    for status, priority, count, overdue_count in rows:
+        by_status[status or "todo"] += count
+        by_priority[priority or "medium"] += count
+        total += count
+        overdue += overdue_count
+    return {"total": total, "overdue": overdue, "by_status": by_status, "by_priority": by_priority}
+
+def _workload(db: Session, condition, group_column) -> list:
+    rows = db.execute(
+        select(group_column, func.count(), func.count().filter(_is_open), func.count().filter(_is_overdue))
+        .where(condition)
+        .group_by(group_column)
+        .order_by(func.count().desc())
+    ).all()
+    return [{"id": key, "total": total, "open": open_count, "overdue": overdue} for key, total, open_count, overdue in rows]
+
+def get_project_summary(db: Session, project_id: UUID):
+    summary = _count_breakdown(db, all_tasks.c.project_id == project_id)
+    if summary["total"] == 0 and not db.query(ProjectModel.id).filter(ProjectModel.id == project_id).first():
+        return None
+    workload = _workload(db, all_tasks.c.project_id == project_id, all_tasks.c.assigned_to)
+    summary["workload"] = [{"user_id": w.pop("id"), **w} for w in workload]
+    return {"project_id": project_id, **summary}
+
+# tasks assigned to a user, across projects
+def get_user_summary(db: Session, user_id: UUID):
+    summary = _count_breakdown(db, all_tasks.c.assigned_to == user_id)
+    if summary["total"] == 0 and not db.query(UserModel.id).filter(UserModel.id == user_id).first():
+        return None
+    workload = _workload(db, all_tasks.c.assigned_to == user_id, all_tasks.c.project_id)
+    summary["projects"] = [{"project_id": w.pop("id"), **w} for w in workload]
+    return {"user_id": user_id, **summary}
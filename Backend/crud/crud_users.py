@@ -1,8 +1,30 @@
 from models import User as UserModel
-from schemas import UserCreate, UserBase
+from models import ProjectMember
+from schemas import UserCreate, UserBase, UserRead
 from uuid import UUID
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from database import StillReferenced, execute_returning, is_foreign_key_violation
+from fastjson import schema_columns
 from security import verify_password, get_password_hash
+import revocation
+from typing import Optional
+from pagination import paginate
+from config import settings
+from ttl_cache import TTLCache
+from crud.crud_project import project_access
+from read_cache import invalidate
+import events
+
+# users loaded by the auth dependency (dependencies.get_current_user), keyed by id.
+# update_user / delete_user drop the entry, here and on the other workers, so changes are visible on the next request.
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+events.on_invalidate("users", lambda key: user_cache.invalidate(UUID(key)), user_cache.clear)
+
+def _forget_user(user_id: UUID):
+    user_cache.invalidate(user_id)
+    events.broadcast_invalidation("users", user_id)
 
 
 """
@@ -16,19 +38,17 @@ It ensures efficient and safe communication with the database.
 In FastAPI, you typically use a Session object to perform CRUD operations within your API endpoints or CRUD functions.
 """ 
 
-# get all users
-def get_all_users(db: Session):
-    return db.query(UserModel).all()
+# get all users (one page at a time, users have no created_at so we page on id)
+def get_all_users(db: Session, cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    return paginate(db.query(*schema_columns(UserRead, UserModel)), (UserModel.id,), cursor, limit)
 
-# Create User
-def create_user(db: Session, user: UserCreate):
+# Create User (pass hashed_password if the caller already hashed it off the event loop)
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None):
     user_data = user.model_dump()
-    user_data["hashed_password"] = get_password_hash(user_data.pop("password"))
-    db_user = UserModel(**user_data) # unpack Pydantic dict into SQLAlchemy model (**user.dict() unpacks that dictionary, so each key-value pair becomes an argument for the User constructor: User(name="John", email="john@example.com", ...).)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)  #refresh to get updated data like the generated UUID
-    return db_user
+    password = user_data.pop("password")
+    user_data["hashed_password"] = hashed_password or get_password_hash(password)
+    # INSERT ... RETURNING gives back the generated UUID and defaults, no refresh query after the commit
+    return execute_returning(db, insert(UserModel).values(**user_data).returning(UserModel))[0]
 
 #get User by Email
 def get_user_by_email(db: Session, email:str):
@@ -40,24 +60,69 @@ def get_user_by_email(db: Session, email:str):
 def get_user(db: Session, user_id: UUID):
     return db.query(UserModel).filter(UserModel.id == user_id).first()
 
+# the version the user's tokens must carry (revocation.py), None if the user doesn't exist
+def get_token_version(db: Session, user_id: UUID) -> Optional[int]:
+    row = db.execute(select(UserModel.token_version).where(UserModel.id == user_id)).first()
+    return None if row is None else (row[0] or 0)
+
+# the auth lookup: the user and the ids of the projects they may access, out of one query
+# (outer join, one row per project; (None, frozenset()) if the user doesn't exist)
+def get_user_with_projects(db: Session, user_id: UUID):
+    rows = db.execute(
+        select(UserModel, project_access.c.project_id)
+        .outerjoin(project_access, project_access.c.user_id == UserModel.id)
+        .where(UserModel.id == user_id)
+    ).all()
+    if not rows:
+        return None, frozenset()
+    return rows[0][0], frozenset(project_id for _, project_id in rows if project_id is not None)
+
+# the member pages of the user's projects show their name / avatar (read_cache.py), drop them on a change
+def _invalidate_member_pages(db: Session, user_id: UUID):
+    if settings.READ_CACHE_ENABLED:
+        invalidate("members", *db.scalars(select(ProjectMember.project_id).where(ProjectMember.user_id == user_id)))
+
 # Update User
 def update_user(db:Session, user_id: UUID, user_update: UserBase):
     db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
     if db_user:
         update_data = user_update.model_dump(exclude_unset=True)
+        roles_changed = "roles" in update_data and update_data["roles"] != db_user.roles
         for key, value in update_data.items():
             setattr(db_user, key, value)
+        if roles_changed:
+            db_user.token_version = (db_user.token_version or 0) + 1  # tokens still carrying the old roles stop working
         db.commit()
         db.refresh(db_user)
+        _forget_user(user_id)
+        _invalidate_member_pages(db, user_id)
+        if roles_changed:
+            revocation.revoke_before(user_id, db_user.token_version)
         return db_user
     
 
+# Replace the stored password hash (transparent rehash after a bcrypt cost change)
+def update_password_hash(db: Session, user_id: UUID, hashed_password: str):
+    db.query(UserModel).filter(UserModel.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+    _forget_user(user_id)
+
 # Delete User by ID
 def delete_user(db: Session, user_id: UUID):
     db_user = get_user(db, user_id)
     if db_user:
+        # nothing cascades: a user still in a project, or who created tasks / projects / comments, hits a
+        # foreign key and stays (StillReferenced, a 409), so a deleted user had no member pages to invalidate
         db.delete(db_user)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError as error:
+            db.rollback()
+            if not is_foreign_key_violation(error):
+                raise
+            raise StillReferenced("user is still a project member or owns projects, tasks or comments") from error
+        _forget_user(user_id)
+        revocation.revoke_all(user_id)
         return db_user # This is useful if you want to confirm what was deleted or send info about the deleted user back in your API response.
 
 
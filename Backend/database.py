@@ -1,18 +1,126 @@
 # SO SQLAlchemy is  a Python Library that helps you interact with databases in a more convenient and Pythonic way
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from fastapi.concurrency import run_in_threadpool
 from config import settings
+from pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+
+# pool settings shared by the sync and async engines (see config.py)
+def engine_options(is_async: bool = False) -> dict:
+    options = _pool_options(is_async)
+    if settings.DATABASE_URL.startswith("sqlite"):
+        # SQLite (local development): a connection may be handed to any threadpool thread
+        options.setdefault("connect_args", {})["check_same_thread"] = False
+    return options
+
+def _pool_options(is_async: bool) -> dict:
+    if settings.DB_EXTERNAL_POOLER:
+        options = {"poolclass": NullPool}
+        if is_async:
+            # PgBouncer in transaction mode can't keep asyncpg's named prepared statements between transactions
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,  # drops dead connections (e.g. after a failover) before we use them
+    }
 
 # create_engine is a method that creates a connection to the database.
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **engine_options())
+
+# SQLite leaves foreign keys unchecked unless asked, on every new connection
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_foreign_keys)
 
 # sessionmaker: This is a factory function to create session objects, which are used to interact with the database (like querying, adding, or deleting rows).
 # autocommit=False: The session will not automatically commit changes to the database. You need to call session.commit() manually.
 # autoflush=False: SQLAlchemy won’t automatically push changes to the database before a query. This avoids unexpected behavior sometimes.
 #bind=engine: This session will use the engine we created to connect to the database.
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind= engine )
+# expire_on_commit=False: the write paths get their rows back from INSERT/UPDATE ... RETURNING, expiring them
+# on commit would cost one more SELECT per row as soon as the response touches an attribute.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind= engine )
+
+# Async mode (settings.DB_ASYNC): same database through an async driver (asyncpg, aiosqlite for SQLite).
+# expire_on_commit=False because an expired attribute would need a lazy load, and lazy loads can't happen
+# implicitly on the event loop (the response is serialized after the crud function already committed).
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    try:
+        async_engine = create_async_engine(settings.ASYNC_DATABASE_URL, **engine_options(is_async=True))
+    except ModuleNotFoundError as exc:  # (a clear message at startup instead of a bare import error)
+        raise RuntimeError(f"DB_ASYNC=true with {settings.ASYNC_DATABASE_URL.split(':', 1)[0]} needs the {exc.name} "
+                           f"package (pip install {exc.name})") from exc
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _sqlite_foreign_keys)
+
+# Read replicas (settings.DATABASE_REPLICA_URLS), same pool settings as the primary; replicas.py decides which
+# one a read-only session is bound to
+replica_engines = [create_engine(url, **engine_options()) for url in settings.DATABASE_REPLICA_URLS]
+async_replica_engines = []
+if settings.DB_ASYNC:
+    async_replica_engines = [create_async_engine(url, **engine_options(is_async=True))
+                             for url in settings.ASYNC_DATABASE_REPLICA_URLS]
+
+# run a sync crud function (fn(db, *args)) without blocking the event loop:
+# - AsyncSession: run_sync hands fn a sync Session whose I/O is awaited on the loop, no thread is tied up
+# - Session: fall back to the threadpool, exactly what FastAPI does for a sync `def` route
+async def run_db(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+# A foreign key pointed at a row that doesn't exist (Postgres SQLSTATE 23503, SQLite has only the message)
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    if code is not None:
+        return code == "23503"
+    return "FOREIGN KEY constraint failed" in str(error.orig)
+
+# A delete other rows still point at (a task with comments, a project with tasks): main.py answers it with a 409
+class StillReferenced(Exception):
+    pass
+
+# Run a single-row INSERT / UPDATE / DELETE ... RETURNING and commit it: one statement instead of
+# "SELECT the referenced rows, write, commit, refresh". Returns the returned row, or None when no row matched
+# or a foreign key points nowhere (how the crud functions say 404). The foreign key violation of a DELETE is
+# StillReferenced(in_use) instead, rows still reference the one being deleted, that's not a 404. Other integrity
+# errors are raised.
+# then(row) may return more statements for the same transaction (the counters, see counters.py), None entries skipped.
+def execute_returning(db, stmt, then=None, in_use="other rows still reference it"):
+    try:
+        row = db.execute(stmt.execution_options(populate_existing=True)).first()
+        if row is not None and then is not None:
+            for follow_up in then(row):
+                if follow_up is not None:
+                    db.execute(follow_up)
+    except IntegrityError as error:
+        db.rollback()
+        if not is_foreign_key_violation(error):
+            raise
+        if stmt.is_delete:
+            raise StillReferenced(in_use) from error
+        return None
+    if row is None:
+        return None
+    db.commit()
+    return row
 
 Base = declarative_base() # used to define models(tables) in a pythonic way , we will create classes that represent database tables.
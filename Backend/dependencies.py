@@ -1,5 +1,7 @@
-from database import SessionLocal
-from fastapi import Depends , HTTPException, status
+import hmac
+from database import SessionLocal, AsyncSessionLocal
+from fastapi import Depends , HTTPException, Request, status
+from config import settings
 
 # Depends: This is FastAPI's dependency injection system. It allows you to declare dependencies (like database session) that FastAPI will automatically provide when calling an endpoint function.   
 # yield db :
@@ -10,51 +12,185 @@ from fastapi import Depends , HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from auth_utils import SECRET_KEY, ALGORITHM
-from crud import crud_users
+from crud.aio import crud_project, crud_tasks, crud_users
+from crud.crud_users import user_cache
+from crud.crud_project import project_access_cache
+from schemas import Principal
 from uuid import UUID
+from typing import Optional
 from sqlalchemy.orm import Session
+import revocation
+import replicas
 
 
 
-def get_db():
+def get_sync_db():
     db= SessionLocal()      # setup: create DB session
     try:
         yield db            # give session to caller (endpoint)
     finally:
         db.close()          # teardown: close session after use    
 
+# same thing for async mode, the session is closed when the async with block exits
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# the session dependency every route uses
+get_db = get_async_db if settings.DB_ASYNC else get_sync_db
+
+# Read-only session for the GET routes: on a read replica when there are some (see replicas.py), on the
+# primary otherwise or right after the caller's own write. Never write through it.
+def get_sync_read_db(request: Request):
+    db = replicas.open_read_session(bearer_user_id(request.headers))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    async with await replicas.open_async_read_session(bearer_user_id(request.headers)) as db:
+        yield db
+
+get_read_db = get_async_read_db if settings.DB_ASYNC else get_sync_read_db
+
 oauth2_schema = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin") 
 
 #f someone wants a token, they should get it from this URL (/auth/token) by sending username & password
 
 
-# get logged-in user
-def get_current_user(token: str= Depends(oauth2_schema), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
 
+# check the signature / expiry and return the claims
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id  = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        UUID(user_id)
+    except (JWTError, ValueError):
         raise credentials_exception
+    return payload
+
+# the user id of a valid "Authorization: Bearer" header, None without one (no 401 here, for the middlewares)
+def bearer_user_id(headers) -> Optional[str]:
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return decode_token(authorization[7:])["sub"]
+    except HTTPException:
+        return None
 
-    user = crud_users.get_user(db, UUID(user_id))
+
+# get logged-in user (the full User row)
+async def get_current_user(request: Request, token: str= Depends(oauth2_schema), db: Session = Depends(get_db)):
+    # loaded at most once per request, get_principal may already have done it
+    if getattr(request.state, "current_user", None) is not None:
+        return request.state.current_user
+
+    user = await _load_user(decode_token(token), db)
+    request.state.current_user = user
+    return user
+
+# the User row behind verified token claims (401 if it's gone or the token was issued before a revocation)
+async def _load_user(payload: dict, db):
+    user_id = UUID(payload["sub"])
+    user = user_cache.get(user_id)
+    if user is not None and (user.token_version or 0) != await current_token_version(user_id, db):
+        user = None  # roles changed / user deleted through another worker and its broadcast didn't reach us: reload
     if user is None:
+        # the same query brings the user's project ids along, for require_project_access
+        user, project_ids = await crud_users.get_user_with_projects(db, user_id)
+        if user is not None:
+            # the cached copy outlives this session: detach it, and treat it as read-only
+            db.expunge(user)
+            user_cache.set(user_id, user)
+            project_access_cache.set(user_id, project_ids)
+            revocation.remember(user_id, user.token_version or 0)
+    if user is None or (user.token_version or 0) != payload.get("ver", 0):
         raise credentials_exception
     return user
 
+# get the caller's id and roles. Use this instead of get_current_user when the handler doesn't need the User row:
+# with settings.AUTH_STATELESS it's answered from the signed token alone, no query.
+async def get_principal(request: Request, token: str= Depends(oauth2_schema), db: Session = Depends(get_db)) -> Principal:
+    if not settings.AUTH_STATELESS:
+        user = await get_current_user(request, token, db)
+        return Principal(id=user.id, roles=user.roles or [], token_version=user.token_version or 0)
+    return await principal_from_token(token, db)
+
+# get_principal for callers that aren't a plain request with an Authorization header
+# (WebSocket / EventSource clients pass the token as ?token=, see routers/feed.py)
+async def authenticate_token(token: str, db) -> Principal:
+    if not settings.AUTH_STATELESS:
+        user = await _load_user(decode_token(token), db)
+        return Principal(id=user.id, roles=user.roles or [], token_version=user.token_version or 0)
+    return await principal_from_token(token, db)
+
+# stateless mode: the signed claims are the principal, unless the token was revoked since
+async def principal_from_token(token: str, db) -> Principal:
+    payload = decode_token(token)
+    principal = Principal(id=payload["sub"], roles=payload.get("roles") or [], token_version=payload.get("ver", 0))
+    if revocation.is_revoked(await current_token_version(principal.id, db), principal.token_version):
+        raise credentials_exception
+    return principal
+
+# users.token_version through revocation's cache (one small query per user and TTL)
+async def current_token_version(user_id: UUID, db):
+    version = revocation.cached_version(user_id)
+    if version is revocation.MISSING:
+        version = await crud_users.get_token_version(db, user_id)
+        revocation.remember(user_id, version)
+    return version
+
+# the diagnostics endpoints (main.py): settings.DIAGNOSTICS_TOKEN or an admin's token, as "Authorization: Bearer"
+async def require_diagnostics(request: Request, db: Session = Depends(get_db)):
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        raise credentials_exception
+    token = authorization[7:].strip()
+    if settings.DIAGNOSTICS_TOKEN and hmac.compare_digest(token.encode(), settings.DIAGNOSTICS_TOKEN.encode()):
+        return
+    principal = await authenticate_token(token, db)
+    if "admin" not in (principal.roles or []):
+        raise HTTPException(status_code=403, detail="Operation not permitted")
+
 # role-based access control helper
 def require_roles(*required_roles: str):
-    def role_checker(current_user = Depends(get_current_user)):
-        user_roles = current_user.roles or []
+    async def role_checker(principal: Principal = Depends(get_principal)):
+        user_roles = principal.roles or []
         # Check if user has any of the required roles
         if not any(role in user_roles for role in required_roles):
             raise HTTPException(status_code=403, detail="Operation not permitted")
-        return current_user
-    return role_checker
\ No newline at end of file
+        return principal
+    return role_checker
+
+# Project-level access control: admins may open any project, everyone else the projects they're a member of
+# or created. The caller's project ids come from project_access_cache (filled by the auth lookup above), so on a
+# warm cache the check costs no query. 403 when the caller has no access.
+async def check_project_access(principal: Principal, project_id: UUID, db):
+    if "admin" in (principal.roles or []):
+        return
+    if project_id not in await crud_project.get_accessible_project_ids(db, principal.id):
+        raise HTTPException(status_code=403, detail="Not a member of this project")
+
+# for the /projects/{project_id}/... routes
+async def require_project_access(project_id: UUID, principal: Principal = Depends(get_principal), db: Session = Depends(get_db)) -> Principal:
+    await check_project_access(principal, project_id, db)
+    return principal
+
+# for the /tasks/{task_id}/... routes: the task's project decides (404 if the task doesn't exist)
+async def require_task_access(task_id: UUID, principal: Principal = Depends(get_principal), db: Session = Depends(get_db)) -> Principal:
+    if "admin" in (principal.roles or []):
+        return principal
+    project_id = await crud_tasks.get_task_project_id(db, task_id)
+    if project_id is None:
+        raise HTTPException(status_code=404, detail="task does not exist")
+    await check_project_access(principal, project_id, db)
+    return principal
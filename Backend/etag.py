@@ -0,0 +1,33 @@
+import hashlib
+from datetime import date
+from fastapi import Request, Response
+
+# Conditional GET helpers. A resource's ETag is a hash of a cheap version token (ids, updated_at / created_at,
+# row counts...) that the routes can fetch without loading or serializing the resource itself.
+# When the client already has that version (If-None-Match), we answer 304 with an empty body.
+
+CACHE_CONTROL = "private, no-cache"  # clients may keep a copy but must revalidate it every time
+
+
+def make_etag(*parts) -> str:
+    raw = "|".join("" if p is None else p.isoformat() if isinstance(p, date) else str(p) for p in parts)
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+# If-None-Match uses the weak comparison (RFC 9110), so W/"x" matches "x"
+def if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import queue
+import select
+import socket
+import threading
+from typing import Optional
+from uuid import UUID
+from pydantic import BaseModel
+from config import settings
+
+# Change feed: crud functions publish an event after they commit a change to a task or a comment, and every
+# client subscribed to that project (routers/feed.py, WebSocket or SSE) receives it as a JSON message
+#   {"type": "task.updated", "project_id": "...", "data": {...}}
+# The broker moves events between uvicorn workers: "memory" only reaches this process (single worker),
+# "postgres" goes through LISTEN/NOTIFY so a change made on one worker reaches subscribers on all of them
+# (gunicorn_conf.py picks it when EVENT_BROKER isn't set and there are several workers).
+# Cache invalidations travel on the same channel, see broadcast_invalidation below.
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_MAX_BYTES = 7900  # Postgres caps a NOTIFY payload at 8000 bytes
+RESYNC = json.dumps({"type": "resync"})  # "you may have missed events, refetch"
+
+
+# per-process fan-out: project id -> subscriber queues. dispatch() may be called from any thread.
+class FeedHub:
+    def __init__(self, queue_size: int):
+        self._queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, project_id: UUID) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._subscribers.setdefault(str(project_id), set()).add((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, project_id: UUID, q: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(str(project_id), set())
+            subscribers.difference_update({s for s in subscribers if s[1] is q})
+            if not subscribers:
+                self._subscribers.pop(str(project_id), None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def dispatch(self, message: str):
+        event = json.loads(message)
+        if event.get("type") == "invalidate":
+            _apply_invalidation(event)
+            return
+        project_id = event.get("project_id")
+        with self._lock:
+            subscribers = list(self._subscribers.get(project_id, ()))
+        self._send(subscribers, message)
+
+    def dispatch_all(self, message: str):
+        with self._lock:
+            subscribers = [s for group in self._subscribers.values() for s in group]
+        self._send(subscribers, message)
+
+    # end every stream (shutdown): subscribers get None and close their connection, clients reconnect elsewhere
+    def close_all(self):
+        self.dispatch_all(None)
+
+    def _send(self, subscribers, message: Optional[str]):
+        for loop, q in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, q, message)
+            except RuntimeError:  # loop already closed
+                pass
+
+
+# runs on the subscriber's loop. A client that doesn't keep up loses its backlog and is told to resync.
+def _deliver(q: asyncio.Queue, message: Optional[str]):
+    try:
+        q.put_nowait(message)
+    except asyncio.QueueFull:
+        while not q.empty():
+            q.get_nowait()
+        q.put_nowait(RESYNC if message is not None else None)
+
+
+class MemoryBroker:
+    def __init__(self, hub: FeedHub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, message: str):
+        self.hub.dispatch(message)
+
+
+# One dedicated connection per worker (not from the pool), owned by a background thread that LISTENs on the
+# channel and sends our own NOTIFYs. Our notifications come back to us like everybody else's, so local
+# subscribers are served through the same path. publish() never blocks the caller.
+class PostgresBroker:
+    def __init__(self, hub: FeedHub, engine, channel: str):
+        self.hub = hub
+        self._engine = engine
+        self._channel = channel
+        self._thread = None
+        self._outbox = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._wake_r = self._wake_w = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        # created here, in the worker: a socketpair made before a (preload) fork would be shared by all workers
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._thread = threading.Thread(target=self._run, name="event-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def publish(self, message: str):
+        if self._thread is None:  # not started (scripts, shell): nobody here is listening anyway
+            self.hub.dispatch(message)
+            return
+        self._outbox.put(message)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:  # already plenty of wake-ups pending
+            pass
+
+    def _connect(self):
+        dialect = self._engine.dialect
+        cargs, cparams = dialect.create_connect_args(self._engine.url)
+        conn = dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        conn.cursor().execute(f'LISTEN "{self._channel}"')
+        return conn
+
+    def _run(self):
+        reconnecting = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if reconnecting:
+                    self.hub.dispatch_all(RESYNC)  # whatever was sent while we were away is lost
+                    clear_caches()  # (invalidations included)
+                self._serve(conn)
+            except Exception:
+                logger.exception("event broker connection failed, reconnecting")
+                reconnecting = True
+                self._stop.wait(1)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _serve(self, conn):
+        cursor = conn.cursor()
+        while not self._stop.is_set():
+            readable, _, _ = select.select([conn, self._wake_r], [], [], 5)
+            if self._wake_r in readable:
+                try:
+                    while self._wake_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            while True:
+                try:
+                    message = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+                cursor.execute("SELECT pg_notify(%s, %s)", (self._channel, message))
+            conn.poll()
+            while conn.notifies:
+                self.hub.dispatch(conn.notifies.pop(0).payload)
+
+
+def _make_broker(hub: FeedHub):
+    if settings.EVENT_BROKER == "postgres":
+        from database import engine
+        return PostgresBroker(hub, engine, settings.EVENT_CHANNEL)
+    if settings.EVENT_BROKER not in ("", "memory"):
+        raise ValueError(f"unknown EVENT_BROKER {settings.EVENT_BROKER!r} (expected memory or postgres)")
+    return MemoryBroker(hub)
+
+
+feed_hub = FeedHub(settings.EVENT_QUEUE_SIZE)
+broker = _make_broker(feed_hub)
+
+
+# called by the crud functions once their change is committed. data: a schema instance / ORM row (dumped
+# through schema) or a plain dict. Oversized payloads only carry the id, clients refetch that row.
+def publish(event_type: str, project_id: UUID, data, schema: Optional[type] = None):
+    if schema is not None:
+        data = schema.model_validate(data, from_attributes=True)
+    if isinstance(data, BaseModel):
+        data = data.model_dump(mode="json")
+    event = {"type": event_type, "project_id": str(project_id), "data": data}
+    message = json.dumps(event, default=str)
+    if len(message.encode()) > NOTIFY_MAX_BYTES:
+        event["data"] = {"id": str(data.get("id"))}
+        event["truncated"] = True
+        message = json.dumps(event, default=str)
+    broker.publish(message)
+
+
+# Cache invalidations: the in-process caches (users, project access, token versions, the memory read cache) are
+# per worker, so a write drops its entry locally and broadcasts {"type": "invalidate", "cache": ..., "keys": [...]}
+# for the other workers. Each cache registers how to drop a key (keys travel as strings) and how to clear
+# everything, which happens when the postgres broker reconnects and may have missed some.
+INVALIDATE_KEYS_PER_MESSAGE = 100  # (uuids: well under NOTIFY_MAX_BYTES)
+
+_invalidators = {}  # cache name -> (drop(key: str), clear())
+
+
+def on_invalidate(cache: str, drop, clear):
+    _invalidators[cache] = (drop, clear)
+
+
+def broadcast_invalidation(cache: str, *keys):
+    keys = [str(key) for key in keys]
+    for start in range(0, len(keys), INVALIDATE_KEYS_PER_MESSAGE):
+        broker.publish(json.dumps({"type": "invalidate", "cache": cache, "keys": keys[start:start + INVALIDATE_KEYS_PER_MESSAGE]}))
+
+
+def _apply_invalidation(event: dict):
+    drop, _ = _invalidators.get(event.get("cache"), (None, None))
+    if drop is None:
+        return
+    for key in event.get("keys", ()):
+        try:
+            drop(key)
+        except Exception:
+            logger.exception("dropping %s from the %s cache failed", key, event.get("cache"))
+
+
+def clear_caches():
+    for _, clear in _invalidators.values():
+        clear()
@@ -0,0 +1,150 @@
+import re
+from sqlalchemy import DDL, Float, String, column, event, func, literal_column, table
+from sqlalchemy.dialects.postgresql import UUID
+
+# Full-text search over tasks, projects and comments (crud/crud_search.py), archived ones included.
+#
+# Postgres: each table gets a generated `search_vector tsvector` column (title-like text weighted A, the rest B)
+# and a GIN index on it. The database keeps the column in sync on every INSERT / UPDATE, no application code.
+# SQLite (local development): FTS5 tables kept in sync by triggers, search_index for the hot tables and
+# archive_search_index for tasks_archive / task_comments_archive (a task moving between the two is deleted
+# from one side and inserted on the other, each side's triggers keep its own index).
+#
+# None of this is mapped on the models: it's created next to the tables (create_all, through attach_search_ddl)
+# or by the 0004 / 0007 migrations, and migrations/env.py tells autogenerate to leave these objects alone.
+
+SEARCH_COLUMN = "search_vector"
+TEXT_SEARCH_CONFIG = "english"
+
+# table -> (weight A text, weight B text)
+SEARCHABLE = {
+    "tasks": ("title", "description"),
+    "projects": ("name", "description"),
+    "task_comments": (None, "content"),
+    "tasks_archive": ("title", "description"),
+    "task_comments_archive": (None, "content"),
+}
+
+
+def search_vector_sql(a_column, b_column) -> str:
+    parts = []
+    if a_column:
+        parts.append(f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce({a_column}, '')), 'A')")
+    parts.append(f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce({b_column}, '')), 'B')")
+    return " || ".join(parts)
+
+
+def search_index_name(table_name: str) -> str:
+    return f"ix_{table_name}_search"
+
+
+# autogenerate filter (migrations/env.py): true for the objects defined here
+def is_search_object(name: str) -> bool:
+    return name == SEARCH_COLUMN or name in {search_index_name(t) for t in SEARCHABLE}
+
+
+# SQLite: kind / id / project_id are only carried along, title and body are the indexed text
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "kind UNINDEXED, id UNINDEXED, project_id UNINDEXED, title, body, tokenize = 'porter unicode61')",
+
+    "CREATE TRIGGER IF NOT EXISTS tasks_search_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO search_index (kind, id, project_id, title, body) VALUES ('task', new.id, new.project_id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_search_update AFTER UPDATE OF title, description, project_id ON tasks BEGIN "
+    "DELETE FROM search_index WHERE kind = 'task' AND id = old.id; "
+    "INSERT INTO search_index (kind, id, project_id, title, body) VALUES ('task', new.id, new.project_id, new.title, new.description); "
+    "UPDATE search_index SET project_id = new.project_id WHERE kind = 'comment' AND new.project_id IS NOT old.project_id "
+    "AND id IN (SELECT id FROM task_comments WHERE task_id = new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_search_delete AFTER DELETE ON tasks BEGIN "
+    "DELETE FROM search_index WHERE kind = 'task' AND id = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS projects_search_insert AFTER INSERT ON projects BEGIN "
+    "INSERT INTO search_index (kind, id, project_id, title, body) VALUES ('project', new.id, new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_search_update AFTER UPDATE OF name, description ON projects BEGIN "
+    "DELETE FROM search_index WHERE kind = 'project' AND id = old.id; "
+    "INSERT INTO search_index (kind, id, project_id, title, body) VALUES ('project', new.id, new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS projects_search_delete AFTER DELETE ON projects BEGIN "
+    "DELETE FROM search_index WHERE kind = 'project' AND id = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS task_comments_search_insert AFTER INSERT ON task_comments BEGIN "
+    "INSERT INTO search_index (kind, id, project_id, title, body) "
+    "VALUES ('comment', new.id, (SELECT project_id FROM tasks WHERE id = new.task_id), NULL, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS task_comments_search_update AFTER UPDATE OF content ON task_comments BEGIN "
+    "UPDATE search_index SET body = new.content WHERE kind = 'comment' AND id = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS task_comments_search_delete AFTER DELETE ON task_comments BEGIN "
+    "DELETE FROM search_index WHERE kind = 'comment' AND id = old.id; END",
+
+    # the archive side: rows only come and go (archived tasks are read-only, see archive.py)
+    "CREATE VIRTUAL TABLE IF NOT EXISTS archive_search_index USING fts5("
+    "kind UNINDEXED, id UNINDEXED, project_id UNINDEXED, title, body, tokenize = 'porter unicode61')",
+    # (rows archived before this index existed)
+    "INSERT INTO archive_search_index (kind, id, project_id, title, body) "
+    "SELECT 'task', id, project_id, title, description FROM tasks_archive "
+    "WHERE id NOT IN (SELECT id FROM archive_search_index WHERE kind = 'task')",
+    "INSERT INTO archive_search_index (kind, id, project_id, title, body) "
+    "SELECT 'comment', c.id, t.project_id, NULL, c.content FROM task_comments_archive c JOIN tasks_archive t ON t.id = c.task_id "
+    "WHERE c.id NOT IN (SELECT id FROM archive_search_index WHERE kind = 'comment')",
+
+    "CREATE TRIGGER IF NOT EXISTS tasks_archive_search_insert AFTER INSERT ON tasks_archive BEGIN "
+    "INSERT INTO archive_search_index (kind, id, project_id, title, body) VALUES ('task', new.id, new.project_id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_archive_search_delete AFTER DELETE ON tasks_archive BEGIN "
+    "DELETE FROM archive_search_index WHERE kind = 'task' AND id = old.id; END",
+
+    "CREATE TRIGGER IF NOT EXISTS task_comments_archive_search_insert AFTER INSERT ON task_comments_archive BEGIN "
+    "INSERT INTO archive_search_index (kind, id, project_id, title, body) "
+    "VALUES ('comment', new.id, (SELECT project_id FROM tasks_archive WHERE id = new.task_id), NULL, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS task_comments_archive_search_delete AFTER DELETE ON task_comments_archive BEGIN "
+    "DELETE FROM archive_search_index WHERE kind = 'comment' AND id = old.id; END",
+]
+
+# the FTS5 tables, as selectables for crud_search
+def _fts_table(name: str):
+    return table(
+        name,
+        column("kind", String), column("id", UUID(as_uuid=True)), column("project_id", UUID(as_uuid=True)),
+        column("title", String), column("body", String),
+    )
+
+sqlite_search_index = _fts_table("search_index")
+sqlite_archive_search_index = _fts_table("archive_search_index")
+
+
+def attach_search_ddl(metadata):
+    for table_name, columns in SEARCHABLE.items():
+        t = metadata.tables[table_name]
+        event.listen(t, "after_create", DDL(
+            f"ALTER TABLE {table_name} ADD COLUMN {SEARCH_COLUMN} tsvector "
+            f"GENERATED ALWAYS AS ({search_vector_sql(*columns)}) STORED"
+        ).execute_if(dialect="postgresql"))
+        event.listen(t, "after_create", DDL(
+            f"CREATE INDEX {search_index_name(table_name)} ON {table_name} USING gin ({SEARCH_COLUMN})"
+        ).execute_if(dialect="postgresql"))
+    for statement in SQLITE_FTS_DDL:
+        event.listen(metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for name in ("search_index", "archive_search_index"):
+        event.listen(metadata, "before_drop", DDL(f"DROP TABLE IF EXISTS {name}").execute_if(dialect="sqlite"))
+
+
+# Query helpers
+
+# the generated column of a table, for queries (it isn't mapped)
+def search_vector(table_name: str):
+    return literal_column(f"{table_name}.{SEARCH_COLUMN}")
+
+def pg_query(text: str):
+    # websearch syntax: words, "quoted phrases", -excluded, OR. Never a syntax error on user input.
+    return func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, text)
+
+# FTS5 has its own query syntax; keep the words only and require all of them
+def sqlite_query(text: str):
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words)
+
+def sqlite_match(fts_query: str, index: str = "search_index"):
+    return literal_column(index).op("MATCH")(fts_query)
+
+# bm25 is "lower is better"; column weights follow the SQLite table (kind, id, project_id, title, body)
+def sqlite_rank(index: str = "search_index"):
+    return func.bm25(literal_column(index), 0.0, 0.0, 0.0, 4.0, 1.0, type_=Float)
@@ -0,0 +1,54 @@
+import logging
+import multiprocessing
+from config import settings
+
+# Production server: gunicorn supervising uvicorn workers
+#   gunicorn -c gunicorn_conf.py main:app
+# Every worker has its own connection pool: the database sees up to workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# connections, size MAX_WORKERS / the pool accordingly.
+
+
+def _worker_count() -> int:
+    if settings.WEB_CONCURRENCY > 0:
+        return settings.WEB_CONCURRENCY
+    workers = max(int(multiprocessing.cpu_count() * settings.WORKERS_PER_CORE), 2)
+    if settings.MAX_WORKERS > 0:
+        workers = min(workers, settings.MAX_WORKERS)
+    return workers
+
+
+bind = settings.BIND
+workers = _worker_count()
+
+# Change feed events and cache invalidations published by one worker have to reach the others: with several
+# workers on Postgres the broker defaults to LISTEN/NOTIFY (events.py). Set before the app is imported (preload
+# or not, the workers inherit these settings).
+if not settings.EVENT_BROKER:
+    settings.EVENT_BROKER = "postgres" if workers > 1 and settings.DATABASE_URL.startswith("postgresql") else "memory"
+if workers > 1 and settings.EVENT_BROKER == "memory":
+    logging.getLogger(__name__).warning(
+        "EVENT_BROKER=memory with %d workers: feed events and cache invalidations stay in the worker that made "
+        "the change, other workers serve their cached users / project access / reads (READ_CACHE_BACKEND=%s) until "
+        "the entries expire", workers, settings.READ_CACHE_BACKEND)
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = settings.PRELOAD_APP
+# after SIGTERM a worker drains (SHUTDOWN_DRAIN_SECONDS), then finishes its in-flight requests
+graceful_timeout = int(settings.SHUTDOWN_DRAIN_SECONDS) + settings.GRACEFUL_TIMEOUT
+keepalive = 5
+
+
+# in the master, once, before any worker exists: wait for the database and create the tables
+# (workers see TASKFLOW_DB_PREPARED in their environment and skip it)
+def on_starting(server):
+    import lifecycle
+    from database import engine
+    lifecycle.prepare_database()
+    engine.dispose()
+
+
+# connections the master opened belong to the master: forget them in the child without closing them
+def post_fork(server, worker):
+    from database import engine, async_engine
+    engine.dispose(close=False)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
@@ -0,0 +1,170 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from config import settings
+from pool_metrics import pool_status
+
+# Per-request cost: latency, number of SQL statements and time spent in the database.
+# - engine events (before/after_cursor_execute) time every statement and add it to the current request's stats,
+#   found through a contextvar (threadpool calls and AsyncSession.run_sync see the request's context too)
+# - RequestMetricsMiddleware opens the stats for each request, sends them back as a Server-Timing header and
+#   records them in the histograms served by /metrics (Prometheus text format)
+# Statements slower than SLOW_QUERY_MS are logged with the route that ran them.
+# The numbers are per worker process: with several gunicorn workers every scrape sees one of them.
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    __slots__ = ("route", "queries", "db_time", "slow_queries")
+
+    def __init__(self):
+        self.route = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.slow_queries = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+# SQL statement timing (the recipe from the SQLAlchemy docs: a stack in conn.info, statements don't nest
+# but a failed one never reaches after_cursor_execute, handle_error pops it instead)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record(time.perf_counter() - conn.info["query_start_time"].pop(), statement)
+
+# a failed statement (a foreign key violation the crud functions turn into a 404...) still went to the database
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start_time") if exception_context.connection else None
+    if starts:
+        _record(time.perf_counter() - starts.pop(), exception_context.statement or "")
+
+def _record(elapsed: float, statement: str):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+    if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        if stats is not None:
+            stats.slow_queries += 1
+        logger.warning("slow query (%.1f ms) in %s: %s", elapsed * 1000,
+                       (stats.route if stats is not None else None) or "-", " ".join(statement.split())[:500])
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# Metrics (only touched from the event loop thread)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # labels -> [count per bucket..., sum, count]
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, label_names: tuple) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+LABELS = ("method", "route", "status")
+request_duration = Histogram("http_request_duration_seconds", "Request latency",
+                             (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+request_queries = Histogram("http_request_db_queries", "SQL statements per request",
+                            (0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+request_db_time = Histogram("http_request_db_seconds", "Time spent in SQL statements per request",
+                            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+slow_queries = {}  # (method, route) -> count
+
+
+def render_metrics(engines: dict) -> str:
+    lines = []
+    for histogram in (request_duration, request_queries, request_db_time):
+        lines += histogram.render(LABELS)
+    lines += ["# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS", "# TYPE db_slow_queries_total counter"]
+    for labels, count in sorted(slow_queries.items()):
+        lines.append(f"db_slow_queries_total{{{_labels(LABELS[:2], labels)}}} {count}")
+    # connection pools (see pool_metrics.py)
+    gauges = {"size": "db_pool_size", "checked_out": "db_pool_checked_out", "overflow": "db_pool_overflow",
+              "timeouts": "db_pool_timeouts_total"}
+    for key, name in gauges.items():
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for pool_name, engine in engines.items():
+            status = pool_status(engine)
+            if key in status:
+                lines.append(f'{name}{{pool="{pool_name}"}} {status[key]}')
+    return "\n".join(lines) + "\n"
+
+
+# pure ASGI middleware (BaseHTTPMiddleware would run the endpoint in another task and cost a lot more)
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    total = (time.perf_counter() - start) * 1000
+                    value = (f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                             f"app;dur={total:.1f}")
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            stats.route = scope["path"]
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"  # the template: one series per route, not per id
+            labels = (scope["method"], route_path, status_code)
+            request_duration.observe(labels, time.perf_counter() - start)
+            request_queries.observe(labels, stats.queries)
+            request_db_time.observe(labels, stats.db_time)
+            if stats.slow_queries:
+                key = labels[:2]
+                slow_queries[key] = slow_queries.get(key, 0) + stats.slow_queries
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+from config import settings
+from database import Base, engine, async_engine
+import models  # noqa: F401  (registers the tables on Base.metadata for create_all)
+
+# Startup / shutdown of a worker process (see main.lifespan and gunicorn_conf.py).
+# - prepare_database: wait for the database (within STARTUP_TIMEOUT_SECONDS) and create_all. Under gunicorn
+#   the master does it once before forking and flags it in the environment, the workers skip it.
+# - prime_pool: open the pool's connections up front so the first requests don't pay for the connects.
+# - draining: on SIGTERM /ready turns 503 for SHUTDOWN_DRAIN_SECONDS (the load balancer stops sending us
+#   traffic) before the server stops accepting connections and finishes the in-flight requests.
+
+logger = logging.getLogger(__name__)
+
+DB_PREPARED_ENV = "TASKFLOW_DB_PREPARED"
+
+ready = False
+draining = False
+
+
+def wait_for_database(timeout: float = settings.STARTUP_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return
+        except Exception as exc:
+            if time.monotonic() + delay > deadline:
+                raise RuntimeError(f"database not reachable after {timeout:g}s") from exc
+            logger.warning("database not reachable yet (%s), retrying", exc.__class__.__name__)
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+
+
+def prepare_database():
+    if os.environ.get(DB_PREPARED_ENV):
+        return
+    wait_for_database()
+    # create database tables (dev convenience, production uses `alembic upgrade head`)
+    if settings.DB_CREATE_ALL:
+        Base.metadata.create_all(bind=engine)
+    os.environ[DB_PREPARED_ENV] = "1"
+
+
+def _prime_sync(size: int):
+    def connect(_):
+        conn = engine.connect()
+        conn.execute(text("SELECT 1"))
+        return conn
+
+    # all at once: checked out together they really are `size` distinct connections
+    with ThreadPoolExecutor(max_workers=size) as pool:
+        for conn in list(pool.map(connect, range(size))):
+            conn.close()  # back to the pool, still open
+
+
+async def _prime_async(size: int):
+    async def connect():
+        conn = await async_engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    for conn in await asyncio.gather(*(connect() for _ in range(size))):
+        await conn.close()
+
+
+# warm the pool the requests actually use (the async one in DB_ASYNC mode)
+async def prime_pool(size: int = settings.DB_POOL_PRIME):
+    target = async_engine if async_engine is not None else engine
+    if size <= 0 or isinstance(target.pool, NullPool):
+        return
+    size = min(size, settings.DB_POOL_SIZE)
+    if async_engine is not None:
+        await _prime_async(size)
+    else:
+        await asyncio.to_thread(_prime_sync, size)
+
+
+# chain in front of the server's own SIGTERM / SIGINT handlers (installed before the lifespan starts):
+# the first signal starts draining, the server's handler only runs SHUTDOWN_DRAIN_SECONDS later.
+# on_shutdown runs right before it (closes what would otherwise keep the server waiting, e.g. the feed streams).
+def install_drain_handler(on_shutdown=None):
+    if threading.current_thread() is not threading.main_thread():
+        return  # signal handlers can only be set from the main thread (not the case under TestClient)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def shutdown(signum, frame, previous=previous):
+            if on_shutdown is not None:
+                on_shutdown()
+            previous(signum, frame)
+
+        def handler(signum, frame, shutdown=shutdown):
+            global draining
+            if draining:  # second signal: stop now
+                shutdown(signum, frame)
+                return
+            draining = True
+            logger.info("draining for %ss before shutdown", settings.SHUTDOWN_DRAIN_SECONDS)
+            loop.call_soon_threadsafe(loop.call_later, settings.SHUTDOWN_DRAIN_SECONDS, shutdown, signum, frame)
+
+        signal.signal(sig, handler)
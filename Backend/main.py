@@ -1,17 +1,60 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import users, projects, tasks, auth
-from database import Base, engine
+from fastapi.responses import JSONResponse, PlainTextResponse
+from routers import users, projects, tasks, auth, feed, search, export
+from database import StillReferenced, engine, async_engine, replica_engines, async_replica_engines
 from config import settings
+from dependencies import require_diagnostics
+from pagination import InvalidCursor
+from pool_metrics import pool_status
+from crud.crud_users import user_cache
+from crud.crud_project import project_access_cache
+from crud.crud_tasks import task_project_cache
+from read_cache import read_cache
+from security import PasswordHasherBusy, shutdown_password_pool, warm_password_pool
+import events
+import compression
+import instrumentation
+import lifecycle
+import ratelimit
+import replicas
+
+# startup / shutdown of each worker process (see lifecycle.py)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(lifecycle.prepare_database)  # no-op under gunicorn, the master already did it
+    await lifecycle.prime_pool()
+    warm_up = asyncio.create_task(warm_password_pool())  # in the background, not worth delaying readiness for
+    if settings.RATE_LIMIT_ENABLED:
+        await asyncio.to_thread(ratelimit.store.start)  # (postgres backend: creates its table if needed)
+    events.broker.start()   # change feed (LISTEN/NOTIFY thread with EVENT_BROKER=postgres)
+    lifecycle.install_drain_handler(on_shutdown=events.feed_hub.close_all)
+    lifecycle.ready = True
+    yield
+    lifecycle.ready = False
+    warm_up.cancel()
+    events.broker.stop()
+    shutdown_password_pool()
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="A modern project management application API",
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan,
 )
 
+# Rate limiting, added before CORS so it sits inside it: a 429 still gets the CORS headers the browser needs
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(ratelimit.RateLimitMiddleware)
+
+# Read replicas: remember who just wrote, their next reads go to the primary (see replicas.py)
+if replica_engines:
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,14 +64,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# gzip / br for the larger JSON bodies and the exports (see compression.py)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Per-request latency / SQL statement counts (added last so it is the outermost middleware and times everything)
+if settings.METRICS_ENABLED:
+    instrumentation.instrument_engine(engine)
+    if async_engine is not None:
+        instrumentation.instrument_engine(async_engine.sync_engine)
+    for replica in replica_engines:
+        instrumentation.instrument_engine(replica)
+    for replica in async_replica_engines:
+        instrumentation.instrument_engine(replica.sync_engine)
+    app.add_middleware(instrumentation.RequestMetricsMiddleware)
+
+# A tampered / stale ?cursor= is the client's fault, not a 500
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# A delete blocked by rows that still reference the row (see database.execute_returning)
+@app.exception_handler(StillReferenced)
+def still_referenced_handler(request: Request, exc: StillReferenced):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+# Password worker pool is saturated: shed the load instead of queueing logins forever
+@app.exception_handler(PasswordHasherBusy)
+def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(projects.router)
 app.include_router(tasks.router)
+app.include_router(feed.router)
+app.include_router(search.router)
+app.include_router(export.router)
 
 # Root endpoint
 @app.get("/")
@@ -40,7 +113,57 @@ def read_root():
         "redoc": "/redoc"
     }
 
-# Health check endpoint
+# Health check endpoint (liveness: the process answers)
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+# Readiness: whether the load balancer should send us traffic. 503 until startup is done and while draining.
+@app.get("/ready")
+async def readiness_check():
+    if lifecycle.draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    if not lifecycle.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+# Connection pool diagnostics (per worker process)
+@app.get("/health/pool", dependencies=[Depends(require_diagnostics)])
+def pool_health():
+    pools = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine)
+    for name, replica in _replica_pools().items():
+        pools[name] = pool_status(replica)
+    return pools
+
+# the read replicas' pools, "replica0", "replica1"... (the async ones in DB_ASYNC mode)
+def _replica_pools() -> dict:
+    return {f"replica{index}": replica for index, replica in enumerate(replicas.replica_set.engines)}
+
+# Read replica health as this worker sees it (a failed replica is skipped for REPLICA_RETRY_SECONDS)
+@app.get("/health/replicas", dependencies=[Depends(require_diagnostics)])
+def replica_health():
+    return {"replicas": replicas.replica_set.status(), "recent_writers": replicas.recent_writers.stats()}
+
+# In-process cache diagnostics (per worker process)
+@app.get("/health/cache", dependencies=[Depends(require_diagnostics)])
+def cache_health():
+    return {"users": user_cache.stats(), "project_access": project_access_cache.stats(), "task_projects": task_project_cache.stats(),
+            "reads": read_cache.stats()}
+
+# Change feed diagnostics (per worker process)
+@app.get("/health/feed", dependencies=[Depends(require_diagnostics)])
+def feed_health():
+    return {"broker": settings.EVENT_BROKER or "memory", "subscribers": events.feed_hub.subscriber_count()}
+
+# Prometheus scrape endpoint (per worker process)
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_diagnostics)])
+def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine
+    engines.update(_replica_pools())
+    return PlainTextResponse(instrumentation.render_metrics(engines), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,42 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from config import settings
+from database import Base
+from fulltext import is_search_object
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+# the full-text search columns / indexes (fulltext.py) and the rate limiter's table (ratelimit.py, created by the
+# app itself) aren't on the models, don't let autogenerate drop them
+def include_object(object, name, type_, reflected, compare_to):
+    return not (reflected and compare_to is None and (is_search_object(name) or name == "rate_limit_buckets"))
+
+
+# `alembic upgrade head --sql`: print the SQL instead of running it
+def run_migrations_offline():
+    context.configure(url=settings.DATABASE_URL, target_metadata=target_metadata, literal_binds=True,
+                      include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(settings.DATABASE_URL, poolclass=NullPool)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
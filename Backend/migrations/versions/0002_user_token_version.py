@@ -0,0 +1,21 @@
+"""users.token_version (access token revocation)
+
+Revision ID: 0002_user_token_version
+Revises: 0001_initial_schema
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_user_token_version"
+down_revision = "0001_initial_schema"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    op.drop_column("users", "token_version")
@@ -0,0 +1,37 @@
+"""indexes on foreign keys and on the list / pagination access paths
+
+Revision ID: 0003_foreign_key_indexes
+Revises: 0002_user_token_version
+Create Date: 2026-10-18
+
+On a big live table run this with the app's traffic in mind: CREATE INDEX locks writes to the table
+while it builds. (Postgres' CREATE INDEX CONCURRENTLY avoids that but can't run inside a transaction.)
+"""
+from alembic import op
+
+revision = "0003_foreign_key_indexes"
+down_revision = "0002_user_token_version"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_projects_created_by", "projects", ["created_by"]),
+    ("ix_projects_created_at_id", "projects", ["created_at", "id"]),
+    ("ix_project_members_user_id", "project_members", ["user_id"]),
+    ("ix_tasks_project_id_status", "tasks", ["project_id", "status"]),
+    ("ix_tasks_project_id_created_at_id", "tasks", ["project_id", "created_at", "id"]),
+    ("ix_tasks_assigned_to_due_date", "tasks", ["assigned_to", "due_date"]),
+    ("ix_tasks_created_by", "tasks", ["created_by"]),
+    ("ix_task_comments_task_id_created_at_id", "task_comments", ["task_id", "created_at", "id"]),
+    ("ix_task_comments_user_id", "task_comments", ["user_id"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
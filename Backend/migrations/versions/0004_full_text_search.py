@@ -0,0 +1,40 @@
+"""full-text search: generated tsvector columns + GIN indexes (Postgres)
+
+Revision ID: 0004_full_text_search
+Revises: 0003_foreign_key_indexes
+Create Date: 2026-10-18
+
+Adding a STORED generated column rewrites the table (the vector is computed for every existing row),
+plan it like the indexes of 0003 on a big live database.
+"""
+from alembic import op
+
+revision = "0004_full_text_search"
+down_revision = "0003_foreign_key_indexes"
+branch_labels = None
+depends_on = None
+
+# same definitions as fulltext.SEARCHABLE, frozen here
+VECTORS = {
+    "tasks": "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+             "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+    "projects": "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+    "task_comments": "setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return  # SQLite databases get their FTS5 index from create_all
+    for table, vector in VECTORS.items():
+        op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+        op.execute(f"CREATE INDEX ix_{table}_search ON {table} USING gin (search_vector)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table in reversed(list(VECTORS)):
+        op.execute(f"DROP INDEX ix_{table}_search")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
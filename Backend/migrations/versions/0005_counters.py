@@ -0,0 +1,39 @@
+"""denormalized counters: tasks.comment_count, projects.task_count and per-status task counts
+
+Revision ID: 0005_counters
+Revises: 0004_full_text_search
+Create Date: 2026-10-18
+
+The new columns start at 0 and are then filled from the existing rows, in one UPDATE per table (same counts
+as counters.repair, frozen here). Both UPDATEs write every row of their table, plan it like 0003 / 0004 on a
+big live database.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_counters"
+down_revision = "0004_full_text_search"
+branch_labels = None
+depends_on = None
+
+STATUSES = ["todo", "in_progress", "review", "done"]
+PROJECT_COUNTERS = ["task_count"] + [f"{status}_count" for status in STATUSES]
+
+
+def upgrade():
+    op.add_column("tasks", sa.Column("comment_count", sa.Integer(), nullable=False, server_default="0"))
+    for column in PROJECT_COUNTERS:
+        op.add_column("projects", sa.Column(column, sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute("UPDATE tasks SET comment_count = (SELECT count(*) FROM task_comments WHERE task_comments.task_id = tasks.id)")
+    counts = ["task_count = (SELECT count(*) FROM tasks WHERE tasks.project_id = projects.id)"]
+    for status in STATUSES:
+        counts.append(f"{status}_count = (SELECT count(*) FROM tasks WHERE tasks.project_id = projects.id "
+                      f"AND coalesce(tasks.status, 'todo') = '{status}')")
+    op.execute("UPDATE projects SET " + ", ".join(counts))
+
+
+def downgrade():
+    for column in reversed(PROJECT_COUNTERS):
+        op.drop_column("projects", column)
+    op.drop_column("tasks", "comment_count")
@@ -0,0 +1,60 @@
+"""cold storage: tasks_archive / task_comments_archive for archived projects
+
+Revision ID: 0006_archive_tables
+Revises: 0005_counters
+Create Date: 2026-10-18
+
+Only creates the (empty) tables. Projects that are already archived keep their tasks in the hot tables until
+`python -m archive` moves them, in batches, whenever it suits the database.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006_archive_tables"
+down_revision = "0005_counters"
+branch_labels = None
+depends_on = None
+
+TASK_COLUMNS = "id, title, description, status, priority, project_id, created_by, assigned_to, due_date, created_at, updated_at, comment_count"
+COMMENT_COLUMNS = "id, content, task_id, user_id, created_at, updated_at"
+
+
+def upgrade():
+    # (the enum types already exist, created with tasks in 0001)
+    op.create_table(
+        "tasks_archive",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("status", postgresql.ENUM("todo", "in_progress", "review", "done", name="task_name", create_type=False), nullable=True),
+        sa.Column("priority", postgresql.ENUM("high", "medium", "low", name="task_priority", create_type=False), nullable=True),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("created_by", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("assigned_to", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("due_date", sa.Date(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("comment_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_tasks_archive_project_id_created_at_id", "tasks_archive", ["project_id", "created_at", "id"])
+    op.create_index("ix_tasks_archive_assigned_to_due_date", "tasks_archive", ["assigned_to", "due_date"])
+
+    op.create_table(
+        "task_comments_archive",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("task_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("tasks_archive.id"), nullable=False),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_task_comments_archive_task_id_created_at_id", "task_comments_archive", ["task_id", "created_at", "id"])
+
+
+def downgrade():
+    # (moves the archived rows back first: dropping the tables would lose them)
+    for hot, archived, columns in (("tasks", "tasks_archive", TASK_COLUMNS), ("task_comments", "task_comments_archive", COMMENT_COLUMNS)):
+        op.execute(f"INSERT INTO {hot} ({columns}) SELECT {columns} FROM {archived}")
+    op.drop_table("task_comments_archive")
+    op.drop_table("tasks_archive")
@@ -0,0 +1,38 @@
+"""full-text search over the archive tables: generated tsvector columns + GIN indexes (Postgres)
+
+Revision ID: 0007_archive_search
+Revises: 0006_archive_tables
+Create Date: 2026-10-18
+
+Same columns and indexes as 0004 gave the hot tables, so archived tasks and comments stay searchable.
+Adding the STORED column rewrites the archive tables (the vectors are computed for every archived row).
+"""
+from alembic import op
+
+revision = "0007_archive_search"
+down_revision = "0006_archive_tables"
+branch_labels = None
+depends_on = None
+
+# same definitions as fulltext.SEARCHABLE, frozen here
+VECTORS = {
+    "tasks_archive": "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                     "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+    "task_comments_archive": "setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return  # SQLite databases get their FTS5 index from create_all
+    for table, vector in VECTORS.items():
+        op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+        op.execute(f"CREATE INDEX ix_{table}_search ON {table} USING gin (search_vector)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table in reversed(list(VECTORS)):
+        op.execute(f"DROP INDEX ix_{table}_search")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
@@ -1,8 +1,20 @@
-from sqlalchemy import Column, ARRAY, String, Text, Enum, ForeignKey, DateTime, Date, UniqueConstraint
+from sqlalchemy import Column, ARRAY, JSON, String, Text, Enum, ForeignKey, DateTime, Date, Integer, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
 import uuid
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func 
 from database import Base
+from fulltext import attach_search_ddl
+
+# Postgres types, with stand-ins so the same models also run on SQLite (local development):
+# - roles: a JSON list instead of ARRAY
+# - timestamps: stored in the same text format as SQLite's CURRENT_TIMESTAMP (our server defaults), otherwise
+#   values written from Python ("... 12:00:00.000000") and by the database ("... 12:00:00") wouldn't compare right
+StringList = ARRAY(String).with_variant(JSON(), "sqlite")
+Timestamp = DateTime(timezone=True).with_variant(
+    SQLITE_DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"), "sqlite"
+)
 
 class User(Base):
     __tablename__ = "users"
@@ -19,7 +31,11 @@ class User(Base):
     middle_name = Column(String, nullable=True)
     gender = Column(String, nullable=True)
     avatar_url = Column(String, nullable=True)
-    roles = Column(ARRAY(String), nullable=False)
+    roles = Column(StringList, nullable=False)
+    # bumped whenever the roles change (or the account is deleted); tokens carrying an older version are refused
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    memberships = relationship("ProjectMember", back_populates="user", passive_deletes=True)
 
 # we gonna create a class named User , it will model a table called users.
 #it inherits Base , which is created using declarative_base(). this tells the SQLArchemy that User is a mapped class , it should be traeted as a table in the database
@@ -27,28 +43,49 @@ class User(Base):
 
 class ProjectMember(Base):
     __tablename__ = "project_members"
+    # the unique constraint's index also serves lookups by project_id (leading column); user_id needs its own
     __table_args__ = (UniqueConstraint("project_id", "user_id", name = "unique_project_user"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable = False)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable = False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable = False, index=True)
     role = Column(Enum("manager", "member", name="project_member_role"), default="member")
-    joined_at = Column(DateTime(timezone=True), server_default=func.now())
+    joined_at = Column(Timestamp, server_default=func.now())
+
+    project = relationship("Project", back_populates="members")
+    user = relationship("User", back_populates="memberships")
 
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_created_at_id", "created_at", "id"),  # keyset pagination order
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default= uuid.uuid4)
     name = Column(String, nullable=False)
     description = Column(Text, nullable= False)
     status = Column(Enum("active", "completed", "archived", name="project_status"), default="active")
-    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable= False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable= False, index=True)
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
+    # denormalized task counters, moved by the task writes (see counters.py)
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
+    todo_count = Column(Integer, nullable=False, default=0, server_default="0")
+    in_progress_count = Column(Integer, nullable=False, default=0, server_default="0")
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    done_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    members = relationship("ProjectMember", back_populates="project", passive_deletes=True)
+    tasks = relationship("Task", back_populates="project", passive_deletes=True)
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_project_id_status", "project_id", "status"),
+        Index("ix_tasks_project_id_created_at_id", "project_id", "created_at", "id"),  # a project's task list, page by page
+        Index("ix_tasks_assigned_to_due_date", "assigned_to", "due_date"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String, nullable=False)
@@ -57,18 +94,70 @@ class Task(Base):
     priority = Column(Enum("high", "medium", "low", name= "task_priority"), default="medium")
 
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
-    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
     assigned_to = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable= True)
     due_date = Column(Date, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")  # (see counters.py)
+
+    project = relationship("Project", back_populates="tasks")
+    comments = relationship("TaskComment", back_populates="task", passive_deletes=True)
 
 class TaskComment(Base):
     __tablename__ = "task_comments"
+    __table_args__ = (
+        Index("ix_task_comments_task_id_created_at_id", "task_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key= True, default=uuid.uuid4, nullable = False)
     content = Column(Text, nullable=False)
     task_id = Column(UUID(as_uuid=True), ForeignKey("tasks.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
+
+    task = relationship("Task", back_populates="comments")
+
+# Cold storage (archive.py): an archived project's tasks and comments are moved here, in batches, and back when
+# it's unarchived. Same columns as tasks / task_comments (the moves are INSERT ... SELECT by column name), only
+# the indexes the reads need, and no search vector: archived work drops out of full-text search.
+class TaskArchive(Base):
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_project_id_created_at_id", "project_id", "created_at", "id"),
+        Index("ix_tasks_archive_assigned_to_due_date", "assigned_to", "due_date"),  # (user summaries)
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    status = Column(Task.status.type)
+    priority = Column(Task.priority.type)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    assigned_to = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    due_date = Column(Date, nullable=True)
+    created_at = Column(Timestamp)
+    updated_at = Column(Timestamp)
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+class TaskCommentArchive(Base):
+    __tablename__ = "task_comments_archive"
+    __table_args__ = (
+        Index("ix_task_comments_archive_task_id_created_at_id", "task_id", "created_at", "id"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    content = Column(Text, nullable=False)
+    task_id = Column(UUID(as_uuid=True), ForeignKey("tasks_archive.id"), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    created_at = Column(Timestamp)
+    updated_at = Column(Timestamp)
+
+# relationships: use them in joins (`.join(Project.members)`) or eager-load them with selectinload/joinedload.
+# passive_deletes=True: deleting a parent doesn't load its children to null their foreign key, the database decides.
+# Don't touch an unloaded relationship outside a crud function: in async mode that lazy load can't run.
+
+# full-text search: tsvector columns + GIN indexes on Postgres, an FTS5 table on SQLite (see fulltext.py)
+attach_search_ddl(Base.metadata)
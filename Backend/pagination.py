@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import literal, tuple_
+from config import settings
+
+# Keyset (cursor) pagination: instead of OFFSET we remember the sort key of the last row we sent
+# and ask for the rows that come strictly after it, so every page costs the same no matter how deep we are.
+# The cursor is just the sort key values, JSON encoded and base64'd so clients treat it as an opaque string.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(columns):
+            raise ValueError("cursor does not match sort key")
+        return [_parse(column, value) for column, value in zip(columns, raw)]
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+def _parse(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    return python_type(value)
+
+
+# columns: the sort key, e.g. (Task.created_at, Task.id). The last column must be unique so the order is total.
+def paginate(query, columns, cursor: str = None, limit: int = settings.PAGE_SIZE_DEFAULT):
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        query = query.filter(tuple_(*columns) > tuple_(*[literal(v, c.type) for c, v in zip(columns, values)]))
+    rows = query.order_by(*columns).limit(limit + 1).all()  # one extra row tells us if there is a next page
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return {"items": rows, "next_cursor": next_cursor}
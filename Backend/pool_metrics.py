@@ -0,0 +1,84 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# The stock pools only tell us how many connections are checked out right now.
+# These subclasses also time every checkout (how long a request waited for a connection,
+# including opening a new one) and count pool timeouts, which is what pool exhaustion looks like.
+
+
+class WaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float, timed_out: bool):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class _TimedCheckoutMixin:
+    wait_stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.wait_stats is None:
+                self.wait_stats = WaitStats()
+            self.wait_stats.record(time.perf_counter() - start, timed_out)
+
+    # engine.dispose() swaps in a fresh pool, keep counting into the same stats
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.wait_stats = self.wait_stats
+        return new_pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# live numbers for one engine's pool (sync Engine or AsyncEngine)
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        # NullPool (external pooler mode) keeps nothing open, there is nothing to report
+        return {"pool": type(pool).__name__}
+    stats = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    if getattr(pool, "wait_stats", None) is not None:
+        stats.update(pool.wait_stats.as_dict())
+    return stats
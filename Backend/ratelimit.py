@@ -0,0 +1,236 @@
+import ipaddress
+import logging
+import math
+import time
+from typing import Optional
+import anyio.to_thread
+from sqlalchemy import text
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from config import settings
+from dependencies import bearer_user_id
+from ttl_cache import TTLCache
+
+# Rate limiting with token buckets, one bucket per (route group, caller):
+# - route groups: "auth" (/api/v1/auth/..., bcrypt-heavy), "reads" (GET / HEAD) and "writes" (everything else)
+#   under /api/v1; health checks, /metrics and the docs are never limited
+# - the caller is the user id of a valid bearer token, or the client IP (always the IP on the auth routes,
+#   nobody is logged in there yet). Behind a proxy list it in TRUSTED_PROXIES: the client IP is then the last
+#   X-Forwarded-For address that isn't one of the trusted proxies, otherwise every user would share the proxy's
+#   bucket. (uvicorn's forwarded-allow-ips works too, the peer address is then already the client's.)
+# - a limit "N/period" is a bucket of N tokens refilled at N per period: bursts up to N, N per period sustained
+# Every limited response carries RateLimit-Limit / -Remaining / -Reset (and RateLimit-Policy); a 429 also has
+# Retry-After. Where the buckets live is RATE_LIMIT_BACKEND:
+# - "memory": in the worker, no I/O, but each worker counts on its own (N workers let N times the limit through)
+# - "postgres": one UNLOGGED table, updated with a single atomic upsert per request, shared by every worker;
+#   rows idle for longer than the longest limit period are full buckets again and get deleted now and then
+# If the store fails (database down) requests are let through rather than refused.
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit:
+    def __init__(self, spec: str):
+        count, _, period = spec.partition("/")
+        self.spec = spec
+        self.capacity = int(count)
+        self.period = PERIODS[period.strip().rstrip("s") or "second"]
+        self.rate = self.capacity / self.period  # tokens per second
+
+    def reset_after(self, tokens: float) -> int:
+        # seconds until the bucket is full again
+        return math.ceil((self.capacity - tokens) / self.rate)
+
+    def retry_after(self, tokens: float) -> int:
+        # seconds until one token is available
+        return max(1, math.ceil((1 - tokens) / self.rate))
+
+
+def route_group(method: str, path: str) -> Optional[str]:
+    if not path.startswith("/api/v1/") or method == "OPTIONS":
+        return None
+    if path.startswith("/api/v1/auth/"):
+        return "auth"
+    return "reads" if method in ("GET", "HEAD") else "writes"
+
+
+trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES]
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+# the peer address, or behind trusted proxies the right-most X-Forwarded-For entry they didn't add themselves
+# (the ones to its left are whatever the client sent, anybody can forge those)
+def client_ip(scope, headers: Headers) -> str:
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not trusted_proxies or not _trusted(address):
+        return address
+    for hop in reversed([hop.strip() for value in headers.getlist("x-forwarded-for") for hop in value.split(",")]):
+        if not hop:
+            continue
+        address = hop
+        if not _trusted(hop):
+            break
+    return address
+
+
+def client_key(group: str, scope, headers: Headers) -> str:
+    if group != "auth":
+        user_id = bearer_user_id(headers)  # (an invalid / expired token counts against the IP, the route answers 401)
+        if user_id is not None:
+            return "user:" + user_id
+    return "ip:" + client_ip(scope, headers)
+
+
+# Stores: take(group, key, limit) -> tokens left after this request (negative = refused)
+
+class MemoryStore:
+    def __init__(self, limits: dict):
+        # an idle bucket is full again after one period, it can be forgotten then (TTLCache drops it)
+        self._buckets = {group: TTLCache(settings.RATE_LIMIT_MEMORY_KEYS, limit.period) for group, limit in limits.items()}
+
+    def start(self):
+        pass
+
+    async def take(self, group: str, key: str, limit: Limit) -> float:
+        # only called from the event loop thread, so the read-modify-write below can't interleave
+        buckets = self._buckets[group]
+        now = time.monotonic()
+        tokens, updated = buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+        if tokens >= 1:
+            tokens -= 1
+            buckets.set(key, (tokens, now))
+            return tokens
+        buckets.set(key, (tokens, now))
+        return tokens - 1
+
+
+class PostgresStore:
+    CREATE = text("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+            key text PRIMARY KEY,
+            tokens double precision NOT NULL,
+            updated_at timestamptz NOT NULL,
+            allowed boolean NOT NULL
+        )""")
+    # refill by the time elapsed since the last request (database clock, the same for every worker; the SET
+    # expressions all see the row as it was before the update),
+    # then take a token if there is one. One statement, so concurrent workers can't both spend the last token.
+    REFILLED = "least(:capacity, b.tokens + extract(epoch FROM now() - b.updated_at) * :rate)"
+    TAKE = text(f"""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at, allowed)
+        VALUES (:key, :capacity - 1, now(), true)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = {REFILLED} - CASE WHEN {REFILLED} >= 1 THEN 1 ELSE 0 END,
+            allowed = {REFILLED} >= 1,
+            updated_at = now()
+        RETURNING tokens, allowed""")
+    PRUNE = text("DELETE FROM rate_limit_buckets WHERE updated_at < now() - :idle * interval '1 second'")
+
+    def __init__(self, limits: dict):
+        from database import async_engine, engine
+        self._engine = engine
+        self._async_engine = async_engine
+        # a bucket left alone for its period is full again, no different from no row at all
+        self._idle = max(limit.period for limit in limits.values())
+        self._next_prune = time.monotonic() + self._idle
+
+    def start(self):
+        with self._engine.begin() as conn:
+            conn.execute(self.CREATE)
+
+    async def take(self, group: str, key: str, limit: Limit) -> float:
+        params = {"key": f"{group}:{key}", "capacity": float(limit.capacity), "rate": limit.rate}
+        prune = time.monotonic() >= self._next_prune
+        if prune:  # (once per idle period and worker, in its own transaction after the take)
+            self._next_prune = time.monotonic() + self._idle
+        if self._async_engine is not None:
+            async with self._async_engine.begin() as conn:
+                row = (await conn.execute(self.TAKE, params)).one()
+            if prune:
+                async with self._async_engine.begin() as conn:
+                    await conn.execute(self.PRUNE, {"idle": self._idle})
+            return self._result(row)
+        return self._result(await anyio.to_thread.run_sync(self._take_sync, params, prune))
+
+    def _take_sync(self, params, prune: bool):
+        with self._engine.begin() as conn:
+            row = conn.execute(self.TAKE, params).one()
+        if prune:
+            with self._engine.begin() as conn:
+                conn.execute(self.PRUNE, {"idle": self._idle})
+        return row
+
+    @staticmethod
+    def _result(row) -> float:
+        tokens, allowed = row
+        return tokens if allowed else tokens - 1
+
+
+def _make_store(limits: dict):
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresStore(limits)
+    if settings.RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"unknown RATE_LIMIT_BACKEND {settings.RATE_LIMIT_BACKEND!r} (expected memory or postgres)")
+    return MemoryStore(limits)
+
+
+limits = {
+    "auth": Limit(settings.RATE_LIMIT_AUTH),
+    "reads": Limit(settings.RATE_LIMIT_READS),
+    "writes": Limit(settings.RATE_LIMIT_WRITES),
+}
+store = _make_store(limits)
+
+
+# pure ASGI, see main.py for where it sits in the middleware stack
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        group = route_group(scope.get("method", ""), scope["path"]) if scope["type"] == "http" else None
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = limits[group]
+        key = client_key(group, scope, Headers(scope=scope))
+        try:
+            tokens = await store.take(group, key, limit)
+        except Exception:
+            logger.exception("rate limit store failed, letting the request through")
+            await self.app(scope, receive, send)
+            return
+
+        allowed = tokens >= 0
+        level = tokens if allowed else tokens + 1  # what is left in the bucket
+        headers = {
+            "RateLimit-Limit": str(limit.capacity),
+            "RateLimit-Remaining": str(math.floor(level) if allowed else 0),
+            "RateLimit-Reset": str(limit.reset_after(level)),
+            "RateLimit-Policy": f"{limit.capacity};w={limit.period}",
+        }
+        if not allowed:
+            headers["Retry-After"] = str(limit.retry_after(level))
+            response = JSONResponse(status_code=429, content={"detail": "Too many requests"}, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in headers.items()]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import pickle
+import anyio.to_thread
+from config import settings
+from ttl_cache import TTLCache
+import events
+
+try:
+    import redis
+except ImportError:  # optional, only for READ_CACHE_BACKEND=external with a READ_CACHE_URL
+    redis = None
+
+# Read-through cache for the crud reads that run on every page view and rarely change:
+#   project (get_project_by_id), task (get_task_by_id), members (get_project_members), comments (get_comment_by_taskId)
+# - a crud function opts in with @cached("<namespace>"); its first argument after db (the project / task id) is
+#   the key, the other arguments (cursor, limit) pick one of the pages cached under it. crud.aio does the
+#   lookup, so every route gets it and direct sync callers still go to the database.
+# - the writes in crud_project / crud_tasks / crud_users call invalidate(namespace, id) once committed, which drops
+#   every page under that key. Values are the same immutable rows the crud functions return; None (not found)
+#   is never cached.
+# - stampede protection: concurrent misses on the same key + page wait for the one load already running
+# - hits / misses are counted per namespace (/health/cache) to size READ_CACHE_SIZE
+# - a route that already read the resource's version for its ETag passes it as cache_version (crud/aio.py):
+#   it's part of the page key, so the body served always belongs to that version
+# The external backend is shared across workers. The memory backend and the settle window after an invalidation
+# are per worker: invalidate() broadcasts the keys (events.broadcast_invalidation) and every worker drops them.
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "taskflow:read:"
+
+
+class MemoryBackend:
+    blocking = False
+    shared = False
+
+    def __init__(self):
+        self._entries = TTLCache(settings.READ_CACHE_SIZE, settings.READ_CACHE_TTL_SECONDS)
+
+    def get(self, key: str):
+        return self._entries.get(key)
+
+    def set(self, key: str, value):
+        self._entries.set(key, value)
+
+    def delete(self, key: str):
+        self._entries.invalidate(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+# a key-value server speaking the Redis client API (get / set with ex= / delete); values are pickled
+class ExternalBackend:
+    shared = True
+
+    def __init__(self, client, blocking: bool = True):
+        self._client = client
+        self.blocking = blocking  # network round-trips: looked up off the event loop
+
+    def get(self, key: str):
+        data = self._client.get(KEY_PREFIX + key)
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key: str, value):
+        self._client.set(KEY_PREFIX + key, pickle.dumps(value), ex=max(1, round(settings.READ_CACHE_TTL_SECONDS)))
+
+    def delete(self, key: str):
+        self._client.delete(KEY_PREFIX + key)
+
+    def clear(self):
+        pass  # (shared: nothing of it is ours to clear)
+
+    def stats(self) -> dict:
+        return {"client": type(self._client).__name__}
+
+
+# Stand-in for a Redis client when READ_CACHE_URL isn't set (local development): same calls, bytes in and out,
+# kept in this process
+class LocalClient:
+    def __init__(self):
+        self._data = TTLCache(settings.READ_CACHE_SIZE, settings.READ_CACHE_TTL_SECONDS)
+
+    def get(self, key: str):
+        return self._data.get(key)
+
+    def set(self, key: str, value: bytes, ex: int = None):
+        self._data.set(key, value)
+
+    def delete(self, key: str):
+        self._data.invalidate(key)
+
+
+def _make_backend():
+    if settings.READ_CACHE_BACKEND == "memory":
+        return MemoryBackend()
+    if settings.READ_CACHE_BACKEND != "external":
+        raise ValueError(f"unknown READ_CACHE_BACKEND {settings.READ_CACHE_BACKEND!r} (expected memory or external)")
+    if not settings.READ_CACHE_URL:
+        return ExternalBackend(LocalClient(), blocking=False)
+    if redis is None:
+        raise RuntimeError("READ_CACHE_URL needs the redis package (pip install redis)")
+    return ExternalBackend(redis.Redis.from_url(settings.READ_CACHE_URL, socket_timeout=1))
+
+
+class ReadCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._loading = {}  # (key, page) -> future of the load in flight
+        settle = settings.READ_CACHE_SETTLE_SECONDS
+        if settings.DATABASE_REPLICA_URLS:
+            settle = max(settle, settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+        self._settling = TTLCache(settings.READ_CACHE_SIZE, settle)  # keys invalidated moments ago
+        self._counts = {}  # namespace -> [hits, misses]
+
+    async def get_or_load(self, namespace: str, entity, page: tuple, load):
+        key = f"{namespace}:{entity}"
+        counts = self._counts.setdefault(namespace, [0, 0])
+        entry = await self._call(self.backend.get, key)
+        if entry is not None and page in entry:
+            counts[0] += 1
+            return entry[page]
+        counts[1] += 1
+
+        flight = (key, page)
+        running = self._loading.get(flight)
+        if running is not None:
+            try:
+                return await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+                return await load()  # the request that was loading it went away, load it ourselves
+        future = asyncio.get_running_loop().create_future()
+        self._loading[flight] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # (retrieved: no "never retrieved" warning when nobody else was waiting)
+            raise
+        finally:
+            del self._loading[flight]
+        future.set_result(value)
+
+        if value is not None and self._settling.get(key) is None:
+            entry = dict(entry or {})
+            entry[page] = value
+            while len(entry) > settings.READ_CACHE_PAGES_PER_KEY:
+                del entry[next(iter(entry))]  # oldest page first
+            await self._call(self.backend.set, key, entry)
+        return value
+
+    # called by the writes (sync code, threadpool or the event loop's run_sync)
+    def invalidate(self, namespace: str, *entities):
+        keys = [f"{namespace}:{entity}" for entity in entities]
+        for key in keys:
+            self.drop(key)
+        events.broadcast_invalidation("read", *keys)
+
+    # one key, in this worker (a shared backend only needs the delete once, from the worker that wrote)
+    def drop(self, key: str, delete: bool = True):
+        self._settling.set(key, True)
+        try:
+            if delete:
+                self.backend.delete(key)
+        except Exception:
+            logger.exception("read cache invalidation failed for %s", key)
+
+    def clear(self):
+        self.backend.clear()
+
+    async def _call(self, fn, *args):
+        try:
+            if self.backend.blocking:
+                return await anyio.to_thread.run_sync(fn, *args)
+            return fn(*args)
+        except Exception:  # cache down: behave as a miss / skip the store, the database still answers
+            logger.exception("read cache %s failed", fn.__name__)
+            return None
+
+    def stats(self) -> dict:
+        namespaces = {}
+        for namespace, (hits, misses) in self._counts.items():
+            lookups = hits + misses
+            namespaces[namespace] = {"hits": hits, "misses": misses,
+                                     "hit_ratio": round(hits / lookups, 4) if lookups else 0.0}
+        return {"backend": settings.READ_CACHE_BACKEND, "store": self.backend.stats(), "namespaces": namespaces,
+                "loading": len(self._loading)}
+
+
+read_cache = ReadCache(_make_backend())
+events.on_invalidate("read", lambda key: read_cache.drop(key, delete=not read_cache.backend.shared), read_cache.clear)
+
+
+# marks a sync crud function fn(db, entity_id, *page_args) as cached under `namespace` (applied in crud/aio.py)
+def cached(namespace: str):
+    def mark(fn):
+        fn.read_cache_namespace = namespace
+        return fn
+    return mark
+
+
+def invalidate(namespace: str, *entities):
+    if settings.READ_CACHE_ENABLED:
+        read_cache.invalidate(namespace, *entities)
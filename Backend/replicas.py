@@ -0,0 +1,141 @@
+import itertools
+import logging
+import time
+from typing import Optional
+from sqlalchemy.exc import DBAPIError
+from starlette.datastructures import Headers
+from config import settings
+from database import AsyncSessionLocal, SessionLocal, async_replica_engines, replica_engines
+from ttl_cache import TTLCache
+import events
+
+# Read replicas for the GET routes (dependencies.get_read_db):
+# - each read-only session is bound to the next replica, round robin
+# - health: the session takes its connection right away (pool_pre_ping weeds out dead ones); a replica that can't
+#   give one is skipped for REPLICA_RETRY_SECONDS and the request tries the next one, then the primary
+# - read-your-writes: for REPLICA_READ_YOUR_WRITES_SECONDS after a user's own successful write (any non-GET under
+#   /api/v1, noted by ReadYourWritesMiddleware) that user's reads go to the primary, so a replica that hasn't
+#   caught up yet can't hide the change. The write is noted on every worker (events.broadcast_invalidation on the
+#   "recent_writers" channel, received as "mark this user" rather than "drop"), so the next read lands on the
+#   primary whichever worker serves it. A worker whose broker reconnected may have missed marks: it reads
+#   everybody's data from the primary for one window.
+# Without DATABASE_REPLICA_URLS every read uses the primary, same as before.
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaSet:
+    def __init__(self, engines: list):
+        self.engines = engines
+        self._turn = itertools.count()
+        self._down_until = [0.0] * len(engines)
+
+    # index of the next healthy replica, None when there's none
+    def pick(self, skip=()) -> Optional[int]:
+        if not self.engines:
+            return None
+        now = time.monotonic()
+        start = next(self._turn)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if index not in skip and self._down_until[index] <= now:
+                return index
+        return None
+
+    def mark_down(self, index: int, error: Exception):
+        logger.warning("replica %s unavailable (%s), reading from the primary for %gs",
+                       self.name(index), error.__class__.__name__, settings.REPLICA_RETRY_SECONDS)
+        self._down_until[index] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+    def name(self, index: int) -> str:
+        return self.engines[index].url.render_as_string(hide_password=True)
+
+    def status(self) -> list:
+        now = time.monotonic()
+        return [{"url": self.name(index), "healthy": self._down_until[index] <= now} for index in range(len(self.engines))]
+
+
+# the engines the requests use: async ones in DB_ASYNC mode
+replica_set = ReplicaSet(async_replica_engines if settings.DB_ASYNC else replica_engines)
+
+# user id -> True, for REPLICA_READ_YOUR_WRITES_SECONDS after that user's last write (on any worker)
+recent_writers = TTLCache(settings.REPLICA_RECENT_WRITERS_SIZE, settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+_all_primary_until = 0.0  # (monotonic; set when marks may have been missed)
+
+
+def _mark_writer(user_id: str):
+    recent_writers.set(user_id, True)
+
+
+def _missed_marks():
+    global _all_primary_until
+    _all_primary_until = time.monotonic() + settings.REPLICA_READ_YOUR_WRITES_SECONDS
+
+
+events.on_invalidate("recent_writers", _mark_writer, _missed_marks)
+
+
+def note_write(user_id: str):
+    _mark_writer(user_id)
+    events.broadcast_invalidation("recent_writers", user_id)
+
+
+def _wants_primary(user_id: Optional[str]) -> bool:
+    if time.monotonic() < _all_primary_until:
+        return True
+    return user_id is not None and recent_writers.get(user_id) is not None
+
+
+def open_read_session(user_id: Optional[str] = None):
+    tried = set()
+    index = None if _wants_primary(user_id) else replica_set.pick()
+    while index is not None:
+        db = SessionLocal(bind=replica_set.engines[index])
+        try:
+            db.connection()
+            return db
+        except (DBAPIError, OSError) as error:
+            db.close()
+            replica_set.mark_down(index, error)
+        tried.add(index)
+        index = replica_set.pick(skip=tried)
+    return SessionLocal()
+
+
+async def open_async_read_session(user_id: Optional[str] = None):
+    tried = set()
+    index = None if _wants_primary(user_id) else replica_set.pick()
+    while index is not None:
+        db = AsyncSessionLocal(bind=replica_set.engines[index])
+        try:
+            await db.connection()
+            return db
+        except (DBAPIError, OSError) as error:
+            await db.close()
+            replica_set.mark_down(index, error)
+        tried.add(index)
+        index = replica_set.pick(skip=tried)
+    return AsyncSessionLocal()
+
+
+# pure ASGI: notes the caller of every successful write so their next reads see it (see main.py)
+class ReadYourWritesMiddleware:
+    def __init__(self, app):
+        from dependencies import bearer_user_id  # (dependencies imports this module)
+        self.app = app
+        self._user_id = bearer_user_id
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not scope["path"].startswith("/api/v1/"):
+            await self.app(scope, receive, send)
+            return
+        user_id = self._user_id(Headers(scope=scope))
+
+        async def send_noting_write(message):
+            if message["type"] == "http.response.start" and user_id is not None and message["status"] < 400:
+                note_write(user_id)
+            await send(message)
+
+        await self.app(scope, receive, send_noting_write)
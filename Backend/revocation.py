@@ -0,0 +1,39 @@
+from uuid import UUID
+from config import settings
+from ttl_cache import TTLCache
+import events
+
+# Token revocation. Every access token carries the user's token_version ("ver" claim). When a user's roles change
+# crud_users bumps users.token_version, and a deleted user has no row at all, so a token is revoked as soon as its
+# "ver" isn't the row's current version. The row is the shared record every worker checks against.
+# Stateless mode (settings.AUTH_STATELESS) reads only that version per request, through a small per-worker cache:
+# revoke_before / revoke_all update it here and drop the entry on the other workers (events.broadcast_invalidation),
+# and TOKEN_VERSION_CACHE_TTL_SECONDS bounds how long a missed broadcast goes unnoticed.
+
+MISSING = object()  # (nothing cached; None is cached for a deleted user)
+
+token_versions = TTLCache(settings.USER_CACHE_SIZE, settings.TOKEN_VERSION_CACHE_TTL_SECONDS)
+events.on_invalidate("token_versions", lambda key: token_versions.invalidate(UUID(key)), token_versions.clear)
+
+
+# the cached current version of the user's tokens: an int, None if the user is gone, MISSING if not cached
+def cached_version(user_id: UUID):
+    return token_versions.get(user_id, MISSING)
+
+
+def remember(user_id: UUID, version):
+    token_versions.set(user_id, version)
+
+
+def revoke_before(user_id: UUID, version: int):
+    token_versions.set(user_id, version)
+    events.broadcast_invalidation("token_versions", user_id)
+
+
+def revoke_all(user_id: UUID):
+    token_versions.set(user_id, None)
+    events.broadcast_invalidation("token_versions", user_id)
+
+
+def is_revoked(current_version, version: int) -> bool:
+    return current_version is None or version != current_version
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from schemas import UserCreate, UserRead, Token
-from crud.crud_users import get_user_by_email, create_user, authenticate_user
+from crud.aio import crud_users
 from auth_utils import create_access_token
+from security import hash_password_async, verify_password_async
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from dependencies import get_db
@@ -9,20 +10,28 @@ from dependencies import get_db
 router = APIRouter(prefix="/api/v1/auth")
 # sign up endpoint
 @router.post("/register", response_model=UserRead)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-	existing = get_user_by_email(db,user.email)
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+	existing = await crud_users.get_user_by_email(db,user.email)
 	if existing:
 		raise HTTPException(status_code=400, detail="User already registered")
-	new_user = create_user(db,user)
+	# bcrypt is slow on purpose, it runs in the password worker pool
+	hashed_password = await hash_password_async(user.password)
+	new_user = await crud_users.create_user(db,user, hashed_password)
 	return new_user
 
 # sign in endpoint
 @router.post("/signin", response_model = Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)): # Depends() means FastAPI will handle extracting and validating the login form data for you.
-	user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)): # Depends() means FastAPI will handle extracting and validating the login form data for you.
+	user = await crud_users.get_user_by_email(db, form_data.username)
+	if user:
+		valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+		if not valid:
+			user = None
+		elif new_hash:
+			await crud_users.update_password_hash(db, user.id, new_hash)  # BCRYPT_ROUNDS changed since this hash was made
 	if not user:
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail= "Incorrect Credentials")
-	access_token = create_access_token({"sub":str(user.id), "roles":user.roles})
+	access_token = create_access_token({"sub":str(user.id), "roles":user.roles, "ver": user.token_version or 0})
 	token = Token(access_token= access_token, token_type= "bearer")
 	return token
 
@@ -0,0 +1,78 @@
+import csv
+import io
+from datetime import date, datetime
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from config import settings
+from crud.aio import crud_project
+from crud.crud_tasks import export_comments_query, export_tasks_query
+from dependencies import get_read_db, require_project_access
+from fastjson import dumps
+from models import Project as ProjectModel
+from schemas import ExportFormat
+
+# Streaming exports of a project's tasks / comments, as NDJSON (one JSON object per line, same fields as the
+# list endpoints) or CSV (header row first):
+#   GET /api/v1/projects/{project_id}/export/tasks?format=ndjson|csv
+#   GET /api/v1/projects/{project_id}/export/comments?format=ndjson|csv
+# Rows come off a server-side cursor EXPORT_BATCH_SIZE at a time (yield_per) and each batch is written out
+# before the next one is fetched, so memory stays flat whatever the size of the project.
+# The request's session stays open until the last row is sent (yield dependencies close after the response).
+
+router = APIRouter(prefix="/api/v1/projects", tags=["export"])
+
+MEDIA_TYPES = {ExportFormat.ndjson: "application/x-ndjson", ExportFormat.csv: "text/csv; charset=utf-8"}
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value  # csv writes None as an empty field and str() of the rest
+
+def _encode(rows, format: ExportFormat) -> bytes:
+    if format == ExportFormat.ndjson:
+        return b"".join(dumps(row._asdict()) + b"\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+def _csv_header(stmt) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([column.key for column in stmt.selected_columns])
+    return buffer.getvalue().encode("utf-8")
+
+
+# sync Session: StreamingResponse pulls each batch through the threadpool
+def _stream(db: Session, stmt, format: ExportFormat):
+    if format == ExportFormat.csv:
+        yield _csv_header(stmt)
+    result = db.execute(stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    for rows in result.partitions():
+        yield _encode(rows, format)
+
+async def _stream_async(db: AsyncSession, stmt, format: ExportFormat):
+    if format == ExportFormat.csv:
+        yield _csv_header(stmt)
+    result = await db.stream(stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        yield _encode(rows, format)
+
+async def _export(db, project_id: UUID, stmt, name: str, format: ExportFormat):
+    if not await crud_project.row_exists(db, ProjectModel, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    body = _stream_async(db, stmt, format) if isinstance(db, AsyncSession) else _stream(db, stmt, format)
+    filename = f"project-{project_id}-{name}.{format.value}"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/{project_id}/export/tasks", dependencies=[Depends(require_project_access)])
+async def api_export_tasks(project_id: UUID, format: ExportFormat = ExportFormat.ndjson, db: Session = Depends(get_read_db)):
+    return await _export(db, project_id, export_tasks_query(project_id), "tasks", format)
+
+@router.get("/{project_id}/export/comments", dependencies=[Depends(require_project_access)])
+async def api_export_comments(project_id: UUID, format: ExportFormat = ExportFormat.ndjson, db: Session = Depends(get_read_db)):
+    return await _export(db, project_id, export_comments_query(project_id), "comments", format)
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from config import settings
+from crud.aio import crud_project
+from database import AsyncSessionLocal, SessionLocal
+from dependencies import authenticate_token, check_project_access, credentials_exception
+from events import feed_hub
+from models import Project as ProjectModel
+
+# Push channel per project: the task / comment changes (events.py) instead of polling the list endpoints.
+#   WebSocket  /api/v1/projects/{project_id}/feed?token=...
+#   SSE        /api/v1/projects/{project_id}/events   (Authorization header, or ?token= for EventSource)
+# Each message is one JSON event; {"type": "resync"} means some events were lost, refetch the lists.
+# Access is checked when the stream opens, then again every EVENT_ACCESS_RECHECK_SECONDS and on every
+# "member.removed" event: the stream ends once the caller can't see the project anymore (removed from it, token
+# expired or revoked, project deleted). The WebSocket is closed with 1008, the SSE response simply ends.
+
+router = APIRouter(prefix="/api/v1/projects", tags=["feed"])
+
+
+# auth + project check on a session of its own: a stream stays open for minutes and mustn't pin a pooled connection
+async def _check_access(project_id: UUID, token: Optional[str]):
+    if not token:
+        raise credentials_exception
+    if settings.DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            return await _authorize(db, project_id, token)
+    db = SessionLocal()
+    try:
+        return await _authorize(db, project_id, token)
+    finally:
+        db.close()
+
+async def _authorize(db, project_id: UUID, token: str):
+    principal = await authenticate_token(token, db)
+    if not await crud_project.row_exists(db, ProjectModel, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    await check_project_access(principal, project_id, db)
+    return principal
+
+async def _still_allowed(project_id: UUID, token: str) -> bool:
+    try:
+        await _check_access(project_id, token)
+        return True
+    except HTTPException:
+        return False
+
+
+class AccessLost(Exception):
+    pass
+
+
+# the project's events for one subscriber: each message, "" when nothing came for EVENT_KEEPALIVE_SECONDS
+# (or a re-check was due), until the server shuts down; AccessLost once the caller may not see them anymore
+async def _messages(project_id: UUID, token: str):
+    loop = asyncio.get_running_loop()
+    queue = feed_hub.subscribe(project_id)
+    recheck_at = loop.time() + settings.EVENT_ACCESS_RECHECK_SECONDS
+    try:
+        while True:
+            timeout = min(settings.EVENT_KEEPALIVE_SECONDS, max(0.0, recheck_at - loop.time()))
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                message = ""
+            if message is None:
+                return
+            removal = '"member.removed"' in message and json.loads(message)["type"] == "member.removed"
+            if removal or loop.time() >= recheck_at:
+                if not await _still_allowed(project_id, token):
+                    raise AccessLost()
+                recheck_at = loop.time() + settings.EVENT_ACCESS_RECHECK_SECONDS
+            yield message
+    finally:
+        feed_hub.unsubscribe(project_id, queue)
+
+
+@router.websocket("/{project_id}/feed")
+async def project_feed_ws(websocket: WebSocket, project_id: UUID, token: Optional[str] = Query(None)):
+    try:
+        await _check_access(project_id, token)
+    except HTTPException as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc.detail))
+        return
+    await websocket.accept()
+    sender = asyncio.create_task(_forward(websocket, _messages(project_id, token)))
+    try:
+        # the client doesn't have to send anything, we only wait for it to go away
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+
+async def _forward(websocket: WebSocket, messages):
+    try:
+        async for message in messages:
+            if message:
+                await websocket.send_text(message)
+        await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+    except AccessLost:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not a member of this project")
+    except Exception:  # connection closed under us, the receive loop sees the disconnect
+        pass
+    finally:
+        await messages.aclose()
+
+
+@router.get("/{project_id}/events")
+async def project_feed_sse(project_id: UUID, request: Request, token: Optional[str] = Query(None)):
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    await _check_access(project_id, token)
+
+    async def stream():
+        messages = _messages(project_id, token)
+        try:
+            yield "retry: 3000\n\n"
+            # ends on shutdown (the client reconnects, retry:) or AccessLost (its reconnect gets the 403)
+            async for message in messages:
+                yield f"data: {message}\n\n" if message else ": keepalive\n\n"  # keeps proxies from closing an idle stream
+        except AccessLost:
+            return
+        finally:
+            await messages.aclose()
+
+    # X-Accel-Buffering: nginx would otherwise buffer the stream
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
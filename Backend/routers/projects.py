@@ -1,93 +1,127 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from crud import crud_project
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Request, Response
+from crud.aio import crud_project, crud_tasks
+import archive
 from uuid import UUID
 from typing import List
 from sqlalchemy.orm import Session
-from dependencies import get_db, get_current_user, require_roles
-from schemas import ProjectBase, ProjectCreate, ProjectMemberCreate, ProjectMemberRead, ProjectRead, UserBase, UserRead
+from dependencies import get_db, get_read_db, get_principal, require_project_access, require_roles
+from fastjson import fast_page
+from etag import if_none_match, make_etag, not_modified, set_etag
+from schemas import ProjectBase, ProjectCreate, ProjectMemberCreate, ProjectMemberRead, ProjectRead, UserBase, UserRead, Page, PageParams, ProjectFilter, ProjectSummary
 
 
 router = APIRouter(prefix = "/api/v1/projects", tags=["projects"])
 
-@router.post("/", response_model= ProjectRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_create_project(project: ProjectCreate, db: Session= Depends(get_db)):
-    db_project = crud_project.create_project(db, project)
+@router.post("/", response_model= ProjectRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_create_project(project: ProjectCreate, db: Session= Depends(get_db)):
+    db_project = await crud_project.create_project(db, project)
+    if not db_project:
+        raise HTTPException(status_code=404, detail="User not found")
     return db_project
 
-@router.get("/", response_model=List[ProjectRead], dependencies=[Depends(get_current_user), Depends(require_roles("admin"))])
-def api_get_all_projects(db: Session= Depends(get_db)):
-    db_projects = crud_project.get_all_project(db)
-    return db_projects
-
-@router.get("/{project_id}", response_model=ProjectRead, dependencies=[Depends(get_current_user)])
-def api_get_project_by_id(project_id: UUID, db: Session = Depends(get_db)):
-    db_project = crud_project.get_project_by_id(db, project_id)
+@router.get("/", response_model=Page[ProjectRead], dependencies=[Depends(get_principal), Depends(require_roles("admin"))])
+async def api_get_all_projects(filters: ProjectFilter = Depends(), page: PageParams = Depends(), db: Session= Depends(get_read_db)):
+    db_projects = await crud_project.get_all_project(db, filters, page.cursor, page.limit)
+    return fast_page(db_projects)
+
+@router.get("/{project_id}", response_model=ProjectRead, dependencies=[Depends(require_project_access)])
+async def api_get_project_by_id(project_id: UUID, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # revalidation: compare against the version token before loading the project
+    version = None
+    if request.headers.get("if-none-match"):
+        version = await crud_project.get_project_version(db, project_id)
+        etag = make_etag("project", project_id, version)
+        if version is not None and if_none_match(request, etag):
+            return not_modified(etag)
+    # (a version we know skips a cached copy older than it, e.g. one another worker hasn't dropped yet)
+    db_project = await crud_project.get_project_by_id(db, project_id, cache_version=version)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
+    set_etag(response, make_etag("project", project_id, db_project.updated_at or db_project.created_at))
     return db_project
 
-@router.put("/{project_id}", response_model= ProjectRead , dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_update_project( project_id : UUID , project_update: ProjectBase, db:Session = Depends(get_db)):
-    updated_project = crud_project.update_project(db, project_id, project_update)
+# task counts for the project dashboard (by status / priority, overdue, per-assignee workload)
+@router.get("/{project_id}/summary", response_model=ProjectSummary, dependencies=[Depends(require_project_access)])
+async def api_get_project_summary(project_id: UUID, db: Session = Depends(get_read_db)):
+    summary = await crud_tasks.get_project_summary(db, project_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return summary
+
+@router.put("/{project_id}", response_model= ProjectRead , dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_update_project( project_id : UUID , project_update: ProjectBase, background_tasks: BackgroundTasks, db:Session = Depends(get_db)):
+    updated_project = await crud_project.update_project(db, project_id, project_update)
     if not updated_project:
         raise HTTPException(status_code=404, detail="Project not found")
+    if "status" in project_update.model_fields_set:
+        background_tasks.add_task(archive.move_in_background, project_id)  # (archived or not anymore, see archive.py)
     return updated_project
 
 
-@router.delete("/{project_id}", response_model= ProjectRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_delete_project(project_id: UUID, db:Session=Depends(get_db)):
-    db_project = crud_project.delete_project(db,project_id)
+@router.delete("/{project_id}", response_model= ProjectRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_delete_project(project_id: UUID, db:Session=Depends(get_db)):
+    db_project = await crud_project.delete_project(db,project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
     return db_project
 
-@router.put("/{project_id}/archive", response_model=ProjectRead , dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_archive_project(project_id: UUID, db:Session = Depends(get_db)):
-    db_project = crud_project.archive_project(db, project_id)
+@router.put("/{project_id}/archive", response_model=ProjectRead , dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_archive_project(project_id: UUID, background_tasks: BackgroundTasks, db:Session = Depends(get_db)):
+    db_project = await crud_project.archive_project(db, project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
+    # its tasks and comments move to the archive tables after the response (see archive.py)
+    background_tasks.add_task(archive.move_in_background, project_id)
     return db_project
 
-@router.post("/{project_id}/invite", response_model= ProjectMemberRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_invite_to_project(project_member_details: ProjectMemberCreate, project_id:UUID, db:Session = Depends(get_db)):
-    project_member_new = crud_project.invite_project(db, project_id, project_member_details)
+@router.put("/{project_id}/unarchive", response_model=ProjectRead , dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_unarchive_project(project_id: UUID, background_tasks: BackgroundTasks, db:Session = Depends(get_db)):
+    db_project = await crud_project.unarchive_project(db, project_id)
+    if not db_project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    background_tasks.add_task(archive.move_in_background, project_id)
+    return db_project
+
+@router.post("/{project_id}/invite", response_model= ProjectMemberRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_invite_to_project(project_member_details: ProjectMemberCreate, project_id:UUID, db:Session = Depends(get_db)):
+    project_member_new = await crud_project.invite_project(db, project_id, project_member_details)
     if not project_member_new:
         raise HTTPException(status_code=404, detail= "user or project not found")
     return project_member_new
 
 
-@router.get("/users/{user_id}/projects", response_model= List[ProjectRead] , dependencies=[Depends(get_current_user)] )
-def api_get_user_projects(user_id: UUID, db : Session = Depends(get_db)):
-    projects = crud_project.get_my_projects(db, user_id)
+@router.get("/users/{user_id}/projects", response_model= Page[ProjectRead] , dependencies=[Depends(get_principal)] )
+async def api_get_user_projects(user_id: UUID, page: PageParams = Depends(), db : Session = Depends(get_read_db)):
+    projects = await crud_project.get_my_projects(db, user_id, page.cursor, page.limit)
 
-    if not projects:
+    if projects is None:
         raise HTTPException(status_code=404, detail="User does not exist")
-    return projects
+    return fast_page(projects)
 
-@router.get("/{project_id}/members", response_model=List[UserRead], dependencies=[Depends(get_current_user)] )
-def api_get_project_members(project_id : UUID, db: Session = Depends(get_db)):
-    members = crud_project.get_project_members(db, project_id)
-    if not members:
+@router.get("/{project_id}/members", response_model=Page[UserRead], dependencies=[Depends(require_project_access)] )
+async def api_get_project_members(project_id : UUID, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    members = await crud_project.get_project_members(db, project_id, page.cursor, page.limit)
+    if members is None:
         raise HTTPException(status_code=404, detail="project does not exist")
-    return members
+    return fast_page(members)
 
-@router.get("/{project_id}/available-users", response_model=List[UserRead], dependencies=[Depends(get_current_user)])
-def api_get_available_users(project_id: UUID, db: Session = Depends(get_db)):
-    available_users = crud_project.get_available_users(db, project_id)
+@router.get("/{project_id}/available-users", response_model=Page[UserRead], dependencies=[Depends(require_project_access)])
+async def api_get_available_users(project_id: UUID, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    available_users = await crud_project.get_available_users(db, project_id, page.cursor, page.limit)
     if available_users is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    return available_users
+    return fast_page(available_users)
 
-@router.delete("/{project_id}/members/{user_id}", response_model=ProjectMemberRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_remove_project_member(project_id: UUID, user_id: UUID, db: Session = Depends(get_db)):
-    removed_member = crud_project.remove_project_member(db, project_id, user_id)
+@router.delete("/{project_id}/members/{user_id}", response_model=ProjectMemberRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_remove_project_member(project_id: UUID, user_id: UUID, db: Session = Depends(get_db)):
+    removed_member = await crud_project.remove_project_member(db, project_id, user_id)
     if not removed_member:
         raise HTTPException(status_code=404, detail="Member not found in project")
     return removed_member
 
-@router.get("/me/projects", response_model=List[ProjectRead], dependencies=[Depends(get_current_user)])
-def api_get_my_projects(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    projects = crud_project.get_my_projects(db, current_user.id)
+@router.get("/me/projects", response_model=Page[ProjectRead], dependencies=[Depends(get_principal)])
+async def api_get_my_projects(page: PageParams = Depends(), current_user = Depends(get_principal), db: Session = Depends(get_read_db)):
+    projects = await crud_project.get_my_projects(db, current_user.id, page.cursor, page.limit)
     if projects is None:
-        return []
-    return projects
\ No newline at end of file
+        return {"items": []}
+    return fast_page(projects)
\ No newline at end of file
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from crud.aio import crud_search
+from dependencies import get_principal, get_read_db
+from schemas import Page, PageParams, SearchFilter, SearchHit
+
+router = APIRouter(prefix="/api/v1/search", tags=["search"])
+
+# ranked search over task titles / descriptions, project names / descriptions and comments
+# (?q=...&kind=task|project|comment&project_id=...), limited to the caller's projects; admins search everything
+@router.get("/", response_model=Page[SearchHit])
+async def api_search(filters: SearchFilter = Depends(), page: PageParams = Depends(), principal = Depends(get_principal), db: Session = Depends(get_read_db)):
+    user_id = None if "admin" in principal.roles else principal.id
+    return await crud_search.search(db, filters, user_id, page.cursor, page.limit)
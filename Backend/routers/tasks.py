@@ -1,78 +1,116 @@
-from fastapi import APIRouter, HTTPException, Depends
-from crud import crud_tasks
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from crud.aio import crud_tasks
 from models import Task as TaskModel
-from schemas import TaskBase, TaskCreate, TaskRead, TaskCommentContent, TaskCommentRead
+from schemas import TaskBase, TaskCreate, TaskRead, TaskCommentContent, TaskCommentRead, Page, PageParams, TaskFilter
+from schemas import BatchResult, TaskBatchAssign, TaskBatchCreate, TaskBatchDelete, TaskBatchUpdate
 from sqlalchemy.orm import Session
-from dependencies import get_db, get_current_user, require_roles
+from dependencies import get_db, get_read_db, get_principal, require_project_access, require_roles, require_task_access
+from fastjson import fast_page
+from etag import if_none_match, make_etag, not_modified, set_etag
 from typing import List
 from uuid import UUID
 
 router = APIRouter(prefix = "/api/v1/tasks", tags=["tasks"])
 
-@router.post("/", response_model= TaskRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_create_task(task: TaskCreate, db: Session = Depends(get_db)):
-    task = crud_tasks.create_task(db, task)
+@router.post("/", response_model= TaskRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_create_task(task: TaskCreate, db: Session = Depends(get_db)):
+    task = await crud_tasks.create_task(db, task)
     if not task:
         raise HTTPException(status_code=404, detail="user or project not found")
     return task
 
-@router.get("/project/{project_id}", response_model= List[TaskRead] , dependencies=[Depends(get_current_user)])
-def api_get_tasks_by_project_id(project_id: UUID, db: Session = Depends(get_db)):
-    tasks = crud_tasks.get_tasks_by_projetId(db, project_id)
-    if not tasks:
+# Batch endpoints (declared before the /{task_id} routes so "batch" isn't read as a task id)
+@router.post("/batch", response_model=BatchResult, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_create_tasks_batch(batch: TaskBatchCreate, db: Session = Depends(get_db)):
+    return await crud_tasks.create_tasks_batch(db, batch.items)
+
+@router.put("/batch", response_model=BatchResult, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_update_tasks_batch(batch: TaskBatchUpdate, db: Session = Depends(get_db)):
+    return await crud_tasks.update_tasks_batch(db, batch.items)
+
+@router.put("/batch/assign", response_model=BatchResult, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_assign_tasks_batch(batch: TaskBatchAssign, db: Session = Depends(get_db)):
+    return await crud_tasks.assign_tasks_batch(db, batch.items)
+
+@router.post("/batch/delete", response_model=BatchResult, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_delete_tasks_batch(batch: TaskBatchDelete, db: Session = Depends(get_db)):
+    return await crud_tasks.delete_tasks_batch(db, batch.ids)
+
+@router.get("/project/{project_id}", response_model= Page[TaskRead] , dependencies=[Depends(require_project_access)])
+async def api_get_tasks_by_project_id(project_id: UUID, request: Request, response: Response, filters: TaskFilter = Depends(), page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    # the ETag covers the whole project's tasks plus the query string (filters / cursor / limit)
+    etag = make_etag("tasks", project_id, request.url.query, *await crud_tasks.get_tasks_version(db, project_id))
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    tasks = await crud_tasks.get_tasks_by_projetId(db, project_id, filters, page.cursor, page.limit)
+    if tasks is None:
         raise HTTPException(status_code=404, detail="Project does not exist")
-    return tasks
+    set_etag(response, etag)
+    return fast_page(tasks, response)
 
-@router.get("/{task_id}", response_model=TaskRead , dependencies=[Depends(get_current_user)] )
-def api_get_task_by_id(task_id: UUID, db:Session = Depends(get_db)):
-    task = crud_tasks.get_task_by_id(db, task_id)
+@router.get("/{task_id}", response_model=TaskRead , dependencies=[Depends(require_task_access)] )
+async def api_get_task_by_id(task_id: UUID, request: Request, response: Response, db:Session = Depends(get_read_db)):
+    version = None
+    if request.headers.get("if-none-match"):
+        version = await crud_tasks.get_task_version(db, task_id)
+        etag = make_etag("task", task_id, version)
+        if version is not None and if_none_match(request, etag):
+            return not_modified(etag)
+    task = await crud_tasks.get_task_by_id(db, task_id, cache_version=version)
     if not task:
         raise HTTPException(status_code=404, detail="task does not exist")
+    set_etag(response, make_etag("task", task_id, task.updated_at or task.created_at))
     return task
 
-@router.put("/{task_id}", response_model = TaskRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_update_task(task_id:  UUID, task_update: TaskBase, db: Session = Depends(get_db)):
-    updated_task = crud_tasks.update_task(db, task_id, task_update)
+@router.put("/{task_id}", response_model = TaskRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_update_task(task_id:  UUID, task_update: TaskBase, db: Session = Depends(get_db)):
+    updated_task = await crud_tasks.update_task(db, task_id, task_update)
     if not updated_task:
         raise HTTPException(status_code=404, detail="Task does not exist")
     return updated_task
 
-@router.delete("/{task_id}", response_model = TaskRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_delete_task(task_id: UUID, db: Session = Depends(get_db)):
-    task_to_delete = crud_tasks.delete_task(db, task_id)
+@router.delete("/{task_id}", response_model = TaskRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_delete_task(task_id: UUID, db: Session = Depends(get_db)):
+    task_to_delete = await crud_tasks.delete_task(db, task_id)
     if not task_to_delete:
         raise HTTPException(status_code=404, detail = "Task does not exist")
     return task_to_delete
 
-@router.put("/{task_id}/assign/{user_id}", response_model= TaskRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin", "project_manager"))])
-def api_assign_task(task_id: UUID, user_id: UUID, db: Session = Depends(get_db)):
-    assigned_task = crud_tasks.assign_task_to_user(db, task_id, user_id)
+@router.put("/{task_id}/assign/{user_id}", response_model= TaskRead, dependencies=[Depends(get_principal), Depends(require_roles("admin", "project_manager"))])
+async def api_assign_task(task_id: UUID, user_id: UUID, db: Session = Depends(get_db)):
+    assigned_task = await crud_tasks.assign_task_to_user(db, task_id, user_id)
     if not assigned_task:
         raise HTTPException(status_code=404, detail="Task or User does not exist.")
     return assigned_task
 
-@router.post("/{task_id}/comments", response_model=TaskCommentRead , dependencies=[Depends(get_current_user)])
-def api_create_task_comment(
+@router.post("/{task_id}/comments", response_model=TaskCommentRead , dependencies=[Depends(require_task_access)])
+async def api_create_task_comment(
     task_id: UUID,
     comment: TaskCommentContent,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_principal)
 ):
-    comment_obj = crud_tasks.add_comment_to_task(db, task_id, current_user.id, comment)
+    comment_obj = await crud_tasks.add_comment_to_task(db, task_id, current_user.id, comment)
     if not comment_obj:
         raise HTTPException(status_code=404, detail="task or user does not exist.")
     return comment_obj
 
-@router.get("/{task_id}/comments", response_model= List[TaskCommentRead] , dependencies=[Depends(get_current_user)])
-def api_get_task_comments(task_id: UUID, db:Session = Depends(get_db)):
-    comments = crud_tasks.get_comment_by_taskId(db, task_id)
-    if not comments:
+@router.get("/{task_id}/comments", response_model= Page[TaskCommentRead] , dependencies=[Depends(require_task_access)])
+async def api_get_task_comments(task_id: UUID, request: Request, response: Response, page: PageParams = Depends(), db:Session = Depends(get_read_db)):
+    version = await crud_tasks.get_comments_version(db, task_id)
+    etag = make_etag("comments", task_id, request.url.query, *version)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    # the body has to be the one the ETag describes: pages cached for another version aren't served
+    comments = await crud_tasks.get_comment_by_taskId(db, task_id, page.cursor, page.limit, cache_version=version)
+    if comments is None:
         raise HTTPException(status_code=404, detail="task does not exist")
-    return comments
+    set_etag(response, etag)
+    return fast_page(comments, response)
 
-@router.put("/comments/{comment_id}", response_model= TaskCommentRead , dependencies=[Depends(get_current_user)])
-def api_update_comment(comment_id: UUID, content_update: TaskCommentContent, db : Session = Depends(get_db)):
-    updated_comment = crud_tasks.update_comment(db, comment_id, content_update)
+@router.put("/comments/{comment_id}", response_model= TaskCommentRead , dependencies=[Depends(get_principal)])
+async def api_update_comment(comment_id: UUID, content_update: TaskCommentContent, db : Session = Depends(get_db)):
+    updated_comment = await crud_tasks.update_comment(db, comment_id, content_update)
     if not updated_comment:
         raise HTTPException(status_code=404, detail="comment does not exist")
     return updated_comment
@@ -1,55 +1,73 @@
 from typing import List
 from fastapi import  Depends, HTTPException, APIRouter
 from sqlalchemy.orm import Session
-from crud import crud_users
-from schemas import UserCreate, UserBase, UserRead, Token
+from crud.aio import crud_users, crud_tasks
+from schemas import UserCreate, UserBase, UserRead, Token, Page, PageParams, Principal, UserSummary
 from uuid import UUID
-from dependencies import get_db, get_current_user, require_roles
+from dependencies import get_db, get_read_db, get_current_user, get_principal, require_roles
+from fastjson import fast_page
+from security import hash_password_async
 
 router = APIRouter(prefix="/api/v1/users", tags=["users"])
 
 # Create User
 @router.post("/", response_model=UserRead)
-def api_create_user(user: UserCreate, db: Session = Depends(get_db)):
-	db_user = crud_users.create_user(db, user)
+async def api_create_user(user: UserCreate, db: Session = Depends(get_db)):
+	hashed_password = await hash_password_async(user.password)
+	db_user = await crud_users.create_user(db, user, hashed_password)
 	return db_user
 
 # Get current user profile
 @router.get("/me", response_model=UserRead)
-def api_get_current_user(current_user = Depends(get_current_user)):
-    return current_user
+async def api_get_current_user(current_user = Depends(get_current_user)):
+	return current_user
 
 # Update my profile - check the user logged-in through token
 @router.put("/me", response_model=UserRead)
-def api_update_my_profile(user_update: UserBase, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    updated_user = crud_users.update_user(db, current_user.id, user_update)
-    return updated_user
+async def api_update_my_profile(user_update: UserBase, current_user = Depends(get_principal), db: Session = Depends(get_db)):
+	updated_user = await crud_users.update_user(db, current_user.id, user_update)
+	return updated_user
+
+# My task counts (assigned to me, by status / priority / project)
+@router.get("/me/summary", response_model=UserSummary)
+async def api_get_my_summary(current_user = Depends(get_principal), db: Session = Depends(get_read_db)):
+	return await crud_tasks.get_user_summary(db, current_user.id)
 
 # Get all users (admin only)
-@router.get("/", response_model=List[UserRead] , dependencies=[Depends(get_current_user), Depends(require_roles("admin"))])
-def api_list_users(db: Session = Depends(get_db)):
-    return crud_users.get_all_users(db)
+@router.get("/", response_model=Page[UserRead] , dependencies=[Depends(get_principal), Depends(require_roles("admin"))])
+async def api_list_users(page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+	return fast_page(await crud_users.get_all_users(db, page.cursor, page.limit))
 
 # Get User by ID
-@router.get("/{user_id}", response_model=UserRead, dependencies=[Depends(get_current_user)])
-def api_get_user(user_id: UUID, db: Session = Depends(get_db)):
-	db_user = crud_users.get_user(db, user_id)
+@router.get("/{user_id}", response_model=UserRead, dependencies=[Depends(get_principal)])
+async def api_get_user(user_id: UUID, db: Session = Depends(get_read_db)):
+	db_user = await crud_users.get_user(db, user_id)
 	if not db_user:
 		raise HTTPException(status_code=404, detail="User not found")
 	return db_user
 
+# Task counts for a user (the user themselves, project managers and admins)
+@router.get("/{user_id}/summary", response_model=UserSummary)
+async def api_get_user_summary(user_id: UUID, principal: Principal = Depends(get_principal), db: Session = Depends(get_read_db)):
+	if principal.id != user_id and not any(role in (principal.roles or []) for role in ("admin", "project_manager")):
+		raise HTTPException(status_code=403, detail="Operation not permitted")
+	summary = await crud_tasks.get_user_summary(db, user_id)
+	if not summary:
+		raise HTTPException(status_code=404, detail="User not found")
+	return summary
+
 # Update User
-@router.put("/{user_id}", response_model=UserRead, dependencies=[Depends(get_current_user)])
-def api_update_user(user_id: UUID, user_update: UserBase, db: Session = Depends(get_db)):
-	db_user = crud_users.update_user(db, user_id, user_update)
+@router.put("/{user_id}", response_model=UserRead, dependencies=[Depends(get_principal)])
+async def api_update_user(user_id: UUID, user_update: UserBase, db: Session = Depends(get_db)):
+	db_user = await crud_users.update_user(db, user_id, user_update)
 	if not db_user:
 		raise HTTPException(status_code=404, detail="User not found")
 	return db_user
 
 # Delete User
-@router.delete("/{user_id}", response_model=UserRead, dependencies=[Depends(get_current_user), Depends(require_roles("admin"))])
-def api_delete_user(user_id: UUID, db: Session = Depends(get_db)):
-	db_user = crud_users.delete_user(db, user_id)
+@router.delete("/{user_id}", response_model=UserRead, dependencies=[Depends(get_principal), Depends(require_roles("admin"))])
+async def api_delete_user(user_id: UUID, db: Session = Depends(get_db)):
+	db_user = await crud_users.delete_user(db, user_id)
 	if not db_user:
 		raise HTTPException(status_code=404, detail="User not found")
 	return db_user
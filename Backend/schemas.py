@@ -1,8 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, Generic, List, Optional, TypeVar
 from uuid import UUID
 from datetime import datetime, date
 from enum import Enum
+from config import settings
 
 # define enum for creating users / registration
 class UserRole(str, Enum):
@@ -44,6 +45,12 @@ class TokenData(BaseModel):
     user_id: Optional[str] = None
     roles: Optional[List[str]] = None
 
+# who is calling, as far as the access token tells us (no database row behind it)
+class Principal(BaseModel):
+    id: UUID
+    roles: List[str] = []
+    token_version: int = 0
+
 #It extends BaseModel so it gets all the features of Pydantic models:
 # Automatic data validation (checks types, required fields, etc.)
 #Easy conversion to and from dictionaries and JSON
@@ -64,6 +71,12 @@ class ProjectRead(ProjectBase):
     created_by: UUID
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # task counts, kept on the project row (counters.py)
+    task_count: int = 0
+    todo_count: int = 0
+    in_progress_count: int = 0
+    review_count: int = 0
+    done_count: int = 0
 
     class Config:
         from_attributes = True
@@ -104,10 +117,71 @@ class TaskRead(TaskBase):
     created_by: UUID
     created_at: datetime
     updated_at: Optional[datetime] = None
+    comment_count: int = 0
 
     class Config:
         from_attributes = True   
 
+# Batch task schemas: one request, many tasks, each item succeeds or fails on its own
+class TaskBatchCreate(BaseModel):
+    items: List[TaskCreate] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+class TaskBatchUpdateItem(TaskBase):
+    id: UUID
+
+class TaskBatchUpdate(BaseModel):
+    items: List[TaskBatchUpdateItem] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+class TaskAssignment(BaseModel):
+    task_id: UUID
+    user_id: UUID
+
+class TaskBatchAssign(BaseModel):
+    items: List[TaskAssignment] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+class TaskBatchDelete(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+class BatchItemResult(BaseModel):
+    index: int                  # position of the item in the request
+    ok: bool
+    id: Optional[UUID] = None   # the task's id (new id for creates)
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
+# Dashboard summary schemas (task counts computed in SQL)
+class AssigneeWorkload(BaseModel):
+    user_id: Optional[UUID] = None   # None = unassigned tasks
+    total: int
+    open: int                        # not done yet
+    overdue: int
+
+class ProjectSummary(BaseModel):
+    project_id: UUID
+    total: int
+    overdue: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    workload: List[AssigneeWorkload]
+
+class ProjectWorkload(BaseModel):
+    project_id: UUID
+    total: int
+    open: int
+    overdue: int
+
+class UserSummary(BaseModel):
+    user_id: UUID
+    total: int
+    overdue: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    projects: List[ProjectWorkload]
+
 # Task Coment schema
 class TaskCommentContent(BaseModel):
     content: str
@@ -120,3 +194,74 @@ class TaskCommentRead(BaseModel):
     user_id: UUID    
     created_at: datetime
     updated_at: Optional[datetime] = None
+
+
+# Pagination schemas
+T = TypeVar("T")
+
+# query parameters shared by every list endpoint (use it as `page: PageParams = Depends()`)
+class PageParams(BaseModel):
+    cursor: Optional[str] = None
+    limit: int = Field(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX)
+
+# one page of results; pass next_cursor back as ?cursor= to get the following page (None means last page)
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+# Filter schemas (query parameters, every field is optional)
+# the values of the models' status / priority columns: an unknown one in a query string is a 422, not a database error
+class TaskStatus(str, Enum):
+    todo = "todo"
+    in_progress = "in_progress"
+    review = "review"
+    done = "done"
+
+class TaskPriority(str, Enum):
+    high = "high"
+    medium = "medium"
+    low = "low"
+
+class ProjectStatus(str, Enum):
+    active = "active"
+    completed = "completed"
+    archived = "archived"
+
+class TaskFilter(BaseModel):
+    status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    assigned_to: Optional[UUID] = None
+    due_after: Optional[date] = None
+    due_before: Optional[date] = None
+
+class ProjectFilter(BaseModel):
+    status: Optional[ProjectStatus] = None
+
+
+# Export
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+# Search
+class SearchKind(str, Enum):
+    task = "task"
+    project = "project"
+    comment = "comment"
+
+class SearchFilter(BaseModel):
+    q: str = Field(min_length=1, max_length=200)
+    kind: Optional[SearchKind] = None
+    project_id: Optional[UUID] = None
+
+# project_id: the project the hit belongs to (the project itself for kind=project).
+# title: task title / project name (for a comment, the title of its task). snippet: start of the matching text.
+class SearchHit(BaseModel):
+    kind: SearchKind
+    id: UUID
+    project_id: UUID
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+    rank: float
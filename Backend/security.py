@@ -1,8 +1,19 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext #secure password hashing
+from config import settings
 
 #bcrypt is resistant to brute force; passlib handles salts and secure hashing for us.
+# min/max rounds pinned to BCRYPT_ROUNDS: hashes made with another cost factor are flagged by verify_and_update,
+# so changing the setting rehashes users transparently the next time they log in.
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 # hash password function (When a user registers)
 def get_password_hash(password: str) -> str:
@@ -10,4 +21,59 @@ def get_password_hash(password: str) -> str:
 
 # check if password is correct function (When a user logs in)
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+# same check, plus a new hash when the stored one uses an outdated cost factor (None otherwise)
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# bcrypt costs ~250ms of CPU per call. Run it in a small process pool so a burst of logins can't hog
+# the worker's threadpool / event loop, and refuse work (PasswordHasherBusy -> 503) once too many calls are queued.
+
+class PasswordHasherBusy(Exception):
+    pass
+
+_executor = None
+_pending = 0   # only touched from the event loop thread
+
+def _get_executor():
+    global _executor
+    if _executor is None and settings.PASSWORD_HASH_WORKERS > 0:
+        # spawn, not fork: the parent has threads (and maybe an event loop) that must not be copied
+        _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor  # None -> the loop's default threadpool
+
+async def _run_password_job(fn, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy("Too many sign-in requests, try again shortly")
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+# returns (is_valid, new_hash_or_None), see verify_and_update_password
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await _run_password_job(verify_and_update_password, plain_password, hashed_password)
+
+def shutdown_password_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _ping():
+    return True
+
+# start the pool's processes now (spawning one takes a while) rather than on the first sign-ins
+async def warm_password_pool():
+    executor = _get_executor()
+    if executor is None:
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(settings.PASSWORD_HASH_WORKERS)))
@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+# The settings are read at import time: point the app at a throwaway SQLite database (tables from create_all)
+# before anything imports config. Cheap bcrypt, no limiter, no password processes, and no settle window after a
+# write, so the read right after it is cached the way it would be on a busy server.
+os.environ.update(
+    DATABASE_URL="sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"),
+    DB_ASYNC="false",
+    DB_CREATE_ALL="true",
+    JWT_SECRET_KEY="test-secret",
+    BCRYPT_ROUNDS="4",
+    PASSWORD_HASH_WORKERS="0",
+    RATE_LIMIT_ENABLED="false",
+    READ_CACHE_SETTLE_SECONDS="0",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+import main  # noqa: E402
+from database import SessionLocal  # noqa: E402
+import models  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def register(client, roles=("project manager",)) -> dict:
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    r = client.post("/api/v1/auth/register", json={"first_name": "a", "last_name": "b", "email": email,
+                                                  "password": "pw", "roles": list(roles)})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def login(client, user: dict) -> dict:
+    r = client.post("/api/v1/auth/signin", data={"username": user["email"], "password": "pw"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": "Bearer " + r.json()["access_token"]}
+
+
+# an admin (roles set in the database, registration doesn't hand them out) and their auth headers
+@pytest.fixture
+def admin(client):
+    user = register(client)
+    session = SessionLocal()
+    session.query(models.User).filter(models.User.id == uuid.UUID(user["id"])).update({"roles": ["admin", "project_manager"]})
+    session.commit()
+    session.close()
+    return user, login(client, user)
+
+
+@pytest.fixture
+def project(client, admin):
+    user, headers = admin
+    r = client.post("/api/v1/projects/", json={"name": "p", "description": "d", "created_by": user["id"]}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def create_task(client, headers, project, user, **fields) -> dict:
+    r = client.post("/api/v1/tasks/", json={"title": "t", "description": "d", "project_id": project["id"],
+                                           "created_by": user["id"], **fields}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
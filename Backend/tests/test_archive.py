@@ -0,0 +1,83 @@
+import uuid
+import counters
+from models import Project, Task, TaskArchive, TaskComment, TaskCommentArchive
+from conftest import create_task
+
+
+def _tiers(db, project) -> dict:
+    project_id = uuid.UUID(project["id"])
+    db.expire_all()
+    tasks = lambda model: db.query(model).filter(model.project_id == project_id).count()
+    comments = lambda model, tasks: db.query(model).join(tasks, tasks.id == model.task_id).filter(tasks.project_id == project_id).count()
+    return {"hot": (tasks(Task), comments(TaskComment, Task)),
+            "archive": (tasks(TaskArchive), comments(TaskCommentArchive, TaskArchive))}
+
+
+def _search(client, headers, q) -> set:
+    r = client.get("/api/v1/search/", params={"q": q}, headers=headers)
+    assert r.status_code == 200, r.text
+    return {(hit["kind"], hit["id"]) for hit in r.json()["items"]}
+
+
+def test_archive_round_trip(client, admin, project, db):
+    user, headers = admin
+    tasks = [create_task(client, headers, project, user, title=f"zeppelin {i}") for i in range(3)]
+    comment = client.post(f"/api/v1/tasks/{tasks[0]['id']}/comments", json={"content": "dirigible notes"}, headers=headers).json()
+    listed = client.get(f"/api/v1/tasks/project/{project['id']}", headers=headers).json()["items"]
+
+    # (the move runs as a background task, done by the time the test client returns)
+    assert client.put(f"/api/v1/projects/{project['id']}/archive", headers=headers).status_code == 200
+    assert _tiers(db, project) == {"hot": (0, 0), "archive": (3, 1)}
+    # reads cover the archive: same tasks, same comments
+    assert client.get(f"/api/v1/tasks/project/{project['id']}", headers=headers).json()["items"] == listed
+    assert client.get(f"/api/v1/tasks/{tasks[0]['id']}", headers=headers).json()["title"] == "zeppelin 0"
+    assert [c["id"] for c in client.get(f"/api/v1/tasks/{tasks[0]['id']}/comments", headers=headers).json()["items"]] == [comment["id"]]
+    # and so does search
+    found = _search(client, headers, "zeppelin") | _search(client, headers, "dirigible")
+    assert {("task", t["id"]) for t in tasks} | {("comment", comment["id"])} <= found
+
+    assert client.put(f"/api/v1/projects/{project['id']}/unarchive", headers=headers).status_code == 200
+    assert _tiers(db, project) == {"hot": (3, 1), "archive": (0, 0)}
+    assert client.get(f"/api/v1/tasks/project/{project['id']}", headers=headers).json()["items"] == listed
+    assert client.put(f"/api/v1/tasks/{tasks[0]['id']}", json={"title": "zeppelin again"}, headers=headers).status_code == 200
+    hits = client.get("/api/v1/search/", params={"q": "dirigible"}, headers=headers).json()["items"]
+    assert [hit["id"] for hit in hits].count(comment["id"]) == 1
+
+
+def test_archived_tasks_are_read_only(client, admin, project):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    client.put(f"/api/v1/projects/{project['id']}/archive", headers=headers)
+
+    url = f"/api/v1/tasks/{task['id']}"
+    assert client.get(url, headers=headers).status_code == 200
+    assert client.put(url, json={"title": "x"}, headers=headers).status_code == 404
+    assert client.put(f"{url}/assign/{user['id']}", headers=headers).status_code == 404
+    assert client.post(f"{url}/comments", json={"content": "x"}, headers=headers).status_code == 404
+    assert client.delete(url, headers=headers).status_code == 404
+    assert client.get(url, headers=headers).status_code == 200
+
+
+# an archived project's tasks still count: repair() counts them in the archive tables, and fixes the archived
+# tasks' comment_count too
+def test_repair_counts_the_archive(client, admin, project, db):
+    user, headers = admin
+    done = create_task(client, headers, project, user, status="done")
+    create_task(client, headers, project, user)
+    client.post(f"/api/v1/tasks/{done['id']}/comments", json={"content": "x"}, headers=headers)
+    client.put(f"/api/v1/projects/{project['id']}/archive", headers=headers)
+    assert _tiers(db, project) == {"hot": (0, 0), "archive": (2, 1)}
+    project_id, task_id = uuid.UUID(project["id"]), uuid.UUID(done["id"])
+
+    counts = lambda: (db.get(Project, project_id).task_count, db.get(Project, project_id).todo_count,
+                      db.get(Project, project_id).done_count, db.get(TaskArchive, task_id).comment_count)
+    assert counters.repair(db) == {"tasks": 0, "projects": 0}
+    db.expire_all()
+    assert counts() == (2, 1, 1, 1)
+
+    db.query(Project).filter(Project.id == project_id).update({"task_count": 0, "done_count": 0})
+    db.query(TaskArchive).filter(TaskArchive.id == task_id).update({"comment_count": 4})
+    db.commit()
+    assert counters.repair(db) == {"tasks": 1, "projects": 1}
+    db.expire_all()
+    assert counts() == (2, 1, 1, 1)
@@ -0,0 +1,70 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from models import Task, TaskComment
+from conftest import create_task
+
+
+def _get(client, headers, url, etag=None):
+    return client.get(url, headers={**headers, **({"If-None-Match": etag} if etag else {})})
+
+
+# SQLite's now() has a one second resolution: move the task's creation back so a write right after it shows in
+# its version
+def _backdate(db, task):
+    db.query(Task).filter(Task.id == uuid.UUID(task["id"])).update(
+        {"created_at": datetime.now(timezone.utc) - timedelta(minutes=1), "updated_at": None})
+    db.commit()
+
+
+def test_task_revalidates_after_a_write(client, admin, project, db):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    _backdate(db, task)
+    url = f"/api/v1/tasks/{task['id']}"
+    first = _get(client, headers, url)
+    etag = first.headers["etag"]
+    assert _get(client, headers, url, etag).status_code == 304
+
+    assert client.put(url, json={"title": "renamed"}, headers=headers).status_code == 200
+    again = _get(client, headers, url, etag)
+    assert again.status_code == 200
+    assert again.json()["title"] == "renamed"
+    assert _get(client, headers, url, again.headers["etag"]).status_code == 304
+
+
+# a write this worker's read cache never heard of (another worker, its invalidation lost): the revalidation
+# still serves the new version, not the cached body under the new ETag
+def test_task_revalidation_skips_a_stale_cached_copy(client, admin, project, db):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    url = f"/api/v1/tasks/{task['id']}"
+    etag = _get(client, headers, url).headers["etag"]  # (cached now)
+    db.query(Task).filter(Task.id == uuid.UUID(task["id"])).update(
+        {"title": "elsewhere", "updated_at": datetime.now(timezone.utc) + timedelta(seconds=1)})
+    db.commit()
+
+    r = _get(client, headers, url, etag)
+    assert r.status_code == 200
+    assert r.json()["title"] == "elsewhere"
+    assert _get(client, headers, url, r.headers["etag"]).status_code == 304
+
+
+def test_comments_revalidate_after_a_write(client, admin, project, db):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    url = f"/api/v1/tasks/{task['id']}/comments"
+    client.post(url, json={"content": "one"}, headers=headers)
+    etag = _get(client, headers, url).headers["etag"]
+    assert _get(client, headers, url, etag).status_code == 304
+
+    client.post(url, json={"content": "two"}, headers=headers)
+    r = _get(client, headers, url, etag)
+    assert r.status_code == 200
+    assert sorted(c["content"] for c in r.json()["items"]) == ["one", "two"]
+
+    db.add(TaskComment(content="three", task_id=uuid.UUID(task["id"]), user_id=uuid.UUID(user["id"])))
+    db.commit()
+    r = _get(client, headers, url, r.headers["etag"])
+    assert r.status_code == 200
+    assert sorted(c["content"] for c in r.json()["items"]) == ["one", "three", "two"]
+    assert _get(client, headers, url, r.headers["etag"]).status_code == 304
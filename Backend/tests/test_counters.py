@@ -0,0 +1,79 @@
+import uuid
+import counters
+from models import Project, Task
+from conftest import create_task
+
+COUNTS = ("task_count", "todo_count", "in_progress_count", "review_count", "done_count")
+
+
+def _project_counts(client, headers, project) -> tuple:
+    body = client.get(f"/api/v1/projects/{project['id']}", headers=headers).json()
+    return tuple(body[key] for key in COUNTS)
+
+
+def _comment_count(client, headers, task) -> int:
+    return client.get(f"/api/v1/tasks/{task['id']}", headers=headers).json()["comment_count"]
+
+
+def test_project_counters_follow_the_task_writes(client, admin, project):
+    user, headers = admin
+    assert _project_counts(client, headers, project) == (0, 0, 0, 0, 0)
+    first = create_task(client, headers, project, user, status="todo")
+    create_task(client, headers, project, user, status="in_progress")
+    create_task(client, headers, project, user)  # (no status counts as todo)
+    assert _project_counts(client, headers, project) == (3, 2, 1, 0, 0)
+
+    assert client.put(f"/api/v1/tasks/{first['id']}", json={"status": "done"}, headers=headers).status_code == 200
+    assert _project_counts(client, headers, project) == (3, 1, 1, 0, 1)
+    assert client.put(f"/api/v1/tasks/{first['id']}", json={"title": "no status change"}, headers=headers).status_code == 200
+    assert _project_counts(client, headers, project) == (3, 1, 1, 0, 1)
+
+    assert client.delete(f"/api/v1/tasks/{first['id']}", headers=headers).status_code == 200
+    assert _project_counts(client, headers, project) == (2, 1, 1, 0, 0)
+
+
+def test_project_counters_follow_the_batch_writes(client, admin, project):
+    user, headers = admin
+    items = [{"title": f"t{i}", "description": "d", "project_id": project["id"], "created_by": user["id"], "status": status}
+             for i, status in enumerate(["todo", "review", "review"])]
+    created = client.post("/api/v1/tasks/batch", json={"items": items}, headers=headers).json()["results"]
+    assert _project_counts(client, headers, project) == (3, 1, 0, 2, 0)
+
+    update = [{"id": created[1]["id"], "status": "done"}, {"id": str(uuid.uuid4()), "status": "done"}]
+    results = client.put("/api/v1/tasks/batch", json={"items": update}, headers=headers).json()["results"]
+    assert [r["ok"] for r in results] == [True, False]
+    assert _project_counts(client, headers, project) == (3, 1, 0, 1, 1)
+
+    client.post("/api/v1/tasks/batch/delete", json={"ids": [created[0]["id"], created[1]["id"]]}, headers=headers)
+    assert _project_counts(client, headers, project) == (1, 0, 0, 1, 0)
+
+
+def test_comment_count(client, admin, project):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    assert _comment_count(client, headers, task) == 0
+    for content in ("one", "two"):
+        assert client.post(f"/api/v1/tasks/{task['id']}/comments", json={"content": content}, headers=headers).status_code == 200
+    assert _comment_count(client, headers, task) == 2
+
+    comment = client.get(f"/api/v1/tasks/{task['id']}/comments", headers=headers).json()["items"][0]
+    client.put(f"/api/v1/tasks/comments/{comment['id']}", json={"content": "edited"}, headers=headers)
+    assert _comment_count(client, headers, task) == 2
+
+
+def test_repair_recomputes_drifted_counters(client, admin, project, db):
+    user, headers = admin
+    task = create_task(client, headers, project, user, status="review")
+    client.post(f"/api/v1/tasks/{task['id']}/comments", json={"content": "one"}, headers=headers)
+    project_id, task_id = uuid.UUID(project["id"]), uuid.UUID(task["id"])
+    db.query(Project).filter(Project.id == project_id).update({"task_count": 7, "review_count": 0, "done_count": 3})
+    db.query(Task).filter(Task.id == task_id).update({"comment_count": 5})
+    db.commit()
+
+    fixed = counters.repair(db)
+    assert fixed["tasks"] >= 1 and fixed["projects"] >= 1
+    db.expire_all()
+    row = db.get(Project, project_id)
+    assert tuple(getattr(row, key) for key in COUNTS) == (1, 0, 0, 1, 0)
+    assert db.get(Task, task_id).comment_count == 1
+    assert counters.repair(db) == {"tasks": 0, "projects": 0}
@@ -0,0 +1,29 @@
+from conftest import create_task, register
+
+
+# nothing cascades: deleting a row others still point at is a 409 and leaves everything in place
+def test_delete_blocked_by_references(client, admin, project):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    client.post(f"/api/v1/tasks/{task['id']}/comments", json={"content": "x"}, headers=headers)
+
+    r = client.delete(f"/api/v1/tasks/{task['id']}", headers=headers)
+    assert r.status_code == 409
+    assert r.json()["detail"] == "task has comments"
+    assert client.get(f"/api/v1/tasks/{task['id']}", headers=headers).status_code == 200
+
+    assert client.delete(f"/api/v1/projects/{project['id']}", headers=headers).status_code == 409
+    assert client.get(f"/api/v1/projects/{project['id']}", headers=headers).status_code == 200
+
+    assert client.delete(f"/api/v1/users/{user['id']}", headers=headers).status_code == 409
+    assert client.get(f"/api/v1/users/{user['id']}", headers=headers).status_code == 200
+
+
+def test_delete_unreferenced(client, admin, project):
+    user, headers = admin
+    task = create_task(client, headers, project, user)
+    assert client.delete(f"/api/v1/tasks/{task['id']}", headers=headers).status_code == 200
+    assert client.delete(f"/api/v1/tasks/{task['id']}", headers=headers).status_code == 404
+
+    other = register(client)
+    assert client.delete(f"/api/v1/users/{other['id']}", headers=headers).status_code == 200
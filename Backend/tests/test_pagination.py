@@ -0,0 +1,79 @@
+import uuid
+from datetime import datetime, timezone
+import pytest
+from models import Task
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from conftest import create_task
+
+KEY = (Task.created_at, Task.id)
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc), uuid.uuid4()]
+    assert decode_cursor(encode_cursor(values), KEY) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30", encode_cursor(["x"]), encode_cursor(["2026-01-01", "not-a-uuid"])])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, KEY)
+
+
+def test_tampered_cursor_is_a_400(client, admin, project):
+    _, headers = admin
+    r = client.get(f"/api/v1/tasks/project/{project['id']}", params={"cursor": "garbage"}, headers=headers)
+    assert r.status_code == 400
+
+
+def _all_pages(client, headers, url, limit, **params):
+    items, cursor = [], None
+    while True:
+        page = client.get(url, params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert page.status_code == 200, page.text
+        body = page.json()
+        assert len(body["items"]) <= limit
+        items += body["items"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_pages_cover_every_task_once_in_order(client, admin, project):
+    user, headers = admin
+    created = [create_task(client, headers, project, user) for _ in range(5)]
+    # a batch shares one created_at: the id breaks the tie
+    batch = client.post("/api/v1/tasks/batch", json={"items": [
+        {"title": "b", "description": "d", "project_id": project["id"], "created_by": user["id"]}] * 4}, headers=headers)
+    ids = {task["id"] for task in created} | {result["id"] for result in batch.json()["results"]}
+
+    items = _all_pages(client, headers, f"/api/v1/tasks/project/{project['id']}", limit=2)
+    assert [item["id"] for item in items] == [item["id"] for item in sorted(items, key=lambda i: (i["created_at"], i["id"]))]
+    assert len(items) == len(ids) == 9
+    assert {item["id"] for item in items} == ids
+
+
+def test_filters(client, admin, project):
+    user, headers = admin
+    create_task(client, headers, project, user, status="done", priority="high")
+    create_task(client, headers, project, user, status="done", priority="low")
+    create_task(client, headers, project, user, status="todo", priority="high", assigned_to=user["id"])
+    url = f"/api/v1/tasks/project/{project['id']}"
+
+    done = _all_pages(client, headers, url, limit=1, status="done")
+    assert len(done) == 2 and all(item["status"] == "done" for item in done)
+    high = _all_pages(client, headers, url, limit=10, priority="high")
+    assert len(high) == 2 and all(item["priority"] == "high" for item in high)
+    mine = _all_pages(client, headers, url, limit=10, assigned_to=user["id"])
+    assert [item["status"] for item in mine] == ["todo"]
+
+
+@pytest.mark.parametrize("params", [{"status": "bogus"}, {"priority": "urgent"}])
+def test_unknown_filter_value_is_a_422(client, admin, project, params):
+    _, headers = admin
+    assert client.get(f"/api/v1/tasks/project/{project['id']}", params=params, headers=headers).status_code == 422
+    assert client.get("/api/v1/projects/", params={"status": "bogus"}, headers=headers).status_code == 422
+
+
+def test_unknown_project_is_a_404(client, admin):
+    _, headers = admin
+    assert client.get(f"/api/v1/tasks/project/{uuid.uuid4()}", headers=headers).status_code in (403, 404)